@@ -0,0 +1,81 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import unicodedata
+
+# 归一化时保留的符号：门牌号、楼栋号中常见，去掉后可能把不同地址合并
+KEEP_SYMBOLS = set("-#.·/")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class AddressNormalizer:
+    """
+    地址归一化：在查询地理编码缓存之前把同一地址的不同写法统一成一个键，
+    如 "XX小区"、"XX小区 "、全角的 "ＸＸ小区（东区）" 只请求一次地理编码
+    - 全角/半角统一（NFKC），英文字母统一为小写
+    - 去掉空白与标点（保留门牌号中常见的 - # . · /）
+    - 可选城市前缀：缺少城市的地址补上城市，"北京XX" 与 "北京市XX" 统一为 "北京市XX"
+    """
+
+    def __init__(self, city_prefix=None, strip_punctuation=True):
+        self.city_prefix = self._fold(city_prefix) if city_prefix else None
+        self.strip_punctuation = strip_punctuation
+
+    @classmethod
+    def from_config(cls, options):
+        """
+        :param options: 配置中的 address_normalization，如 {"enabled": true, "city_prefix": "北京市"}
+        :return: AddressNormalizer；关闭时返回 None
+        """
+        options = options or {}
+        if not options.get("enabled", True):
+            return None
+        return cls(
+            city_prefix=options.get("city_prefix"),
+            strip_punctuation=options.get("strip_punctuation", True)
+        )
+
+    @staticmethod
+    def _fold(text):
+        """全角转半角并去掉所有空白"""
+        return _WHITESPACE.sub("", unicodedata.normalize("NFKC", str(text))).lower()
+
+    def normalize(self, address):
+        """返回地址的规范写法（同时作为缓存键与实际发送给API的地址）"""
+        text = self._fold(address)
+        if self.strip_punctuation:
+            text = "".join(
+                ch for ch in text
+                if ch in KEEP_SYMBOLS or not unicodedata.category(ch).startswith("P")
+            ).strip("-#.·/")
+        if self.city_prefix and text:
+            short_city = self.city_prefix.rstrip("市")
+            if text.startswith(self.city_prefix):
+                pass
+            elif short_city and text.startswith(short_city):
+                text = self.city_prefix + text[len(short_city):]
+            else:
+                text = self.city_prefix + text
+        return text
+
+    def merge_report(self, addresses):
+        """
+        统计归一化合并的效果
+        :return: (原始地址数, 归一化后地址数, 节省的地理编码次数)
+        """
+        raw = {str(address).strip() for address in addresses}
+        merged = {self.normalize(address) for address in raw}
+        return len(raw), len(merged), len(raw) - len(merged)
@@ -13,20 +13,183 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-import json
-from geopy.distance import geodesic
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache_store import MemoryCache
+from rate_limiter import AKPool, QuotaExhaustedError, ThrottledError, CONCURRENCY_STATUS
+from query_planner import QueryPlan
+from metrics import MetricsRegistry
+from job_control import JobCancelled
+
+API_BASE_URL = "https://api.map.baidu.com"
+
+# 默认并发数（同时在途的请求数）
+DEFAULT_MAX_WORKERS = 8
+# 默认超时（连接超时, 读取超时），单位秒
+DEFAULT_TIMEOUT = (3.05, 10)
+# 传输层重试次数（连接失败、读取超时、5xx）
+DEFAULT_RETRIES = 3
+# 分页检索：每页条数（百度上限20）与默认最多页数
+PAGE_SIZE = 20
+DEFAULT_MAX_PAGES = 5
+# 并发超限（401/402）时同一请求最多重试的次数，以及指数退避的初始与最长等待（秒）
+MAX_THROTTLE_RETRIES = 6
+THROTTLE_BACKOFF = 0.1
+MAX_THROTTLE_BACKOFF = 5.0
 
 
 class BaiduMapClient:
-    def __init__(self, ak):
-        self.ak = ak
-        self.geocode_cache = {}
-        self.poi_cache = {}
+    def __init__(self, ak, max_workers=DEFAULT_MAX_WORKERS, cache=None,
+                 pool_size=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 paginate=False, max_pages=DEFAULT_MAX_PAGES, normalizer=None, snapper=None,
+                 poi_backend=None, base_url=API_BASE_URL, on_call=None, metrics=None, limiter=None):
+        # ak 可以是单个AK字符串、AK配置列表或 AKPool
+        self.ak_pool = ak if isinstance(ak, AKPool) else AKPool.from_config(ak)
+        self.max_workers = max_workers
+        # 接口地址：可指向本地模拟服务（mock_server）做压测
+        self.base_url = base_url.rstrip("/")
+        # 每次请求完成后回调 on_call(path, 耗时秒数, status)，用于统计延迟
+        self.on_call = on_call
+        # 指标注册表：接口请求数、status分布、延迟与缓存命中（metrics.MetricsRegistry）
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        # 自适应并发控制（concurrency.AIMDLimiter），不传时在途请求数只受线程池大小限制
+        self.limiter = limiter
+        self.timeout = tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+        # 地址级与字段级线程池可能同时发起请求，连接池默认按两者之和分配
+        self.session = self._create_session(pool_size or max_workers * 2, retries)
+        # 缓存后端：默认进程内缓存，可传入 cache_store.SQLiteCache 持久化
+        self.cache = cache if cache is not None else MemoryCache()
+        # 地址归一化：同一地址的不同写法共用一次地理编码（address_normalizer.AddressNormalizer）
+        self.normalizer = normalizer
+        # 检索中心网格吸附：相邻地址共用POI检索（grid_snap.GridSnapper）
+        self.snapper = snapper
+        # 离线POI检索后端（poi_index.PoiIndex），设置后POI检索不再请求API
+        self.poi_backend = poi_backend
+        # 在途请求表：同一个键同一时间只发起一次请求
+        self._inflight_lock = threading.Lock()
+        self._inflight = {}
+        # 字段级检索线程池，与地址级线程池分开，避免嵌套提交导致死锁
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="baidu-poi"
+        )
+        # 分页检索：翻页请求使用单独的线程池（检索任务本身运行在 _executor 中）
+        self.paginate = paginate
+        self.max_pages = max_pages
+        self._page_executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="baidu-page"
+        ) if paginate else None
+        # 实际发出的检索统计：{(检索词, 半径): [检索次数, 请求页数]}
+        self._page_stats = {}
+        self._stats_lock = threading.Lock()
 
-    def get_location_data(self, address, config_items):
+    @staticmethod
+    def _create_session(pool_size, retries):
+        """创建带连接池（keep-alive）与传输层重试的会话"""
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"])
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def close(self):
+        """释放线程池、连接池与缓存连接"""
+        self._executor.shutdown(wait=False)
+        if self._page_executor:
+            self._page_executor.shutdown(wait=False)
+        self.session.close()
+        self.cache.close()
+
+    def _request(self, path, params, control=None):
+        """
+        发起GET请求并解析JSON（复用连接池，带超时）
+        按AK池限流发出请求，遇到AK受限的状态码时换一个AK重试；
+        并发超限的请求按指数退避（带随机抖动）后重新排队，超过 MAX_THROTTLE_RETRIES 次抛出 ThrottledError，
+        避免持续被限流的AK空转消耗当日配额
+        :param control: job_control.JobControl，每次重试前检查，任务取消后抛出 JobCancelled 而不再等待
+        """
+        labels = {"endpoint": path}
+        throttled = 0
+        while True:
+            if control:
+                control.check()
+            ticket = self.limiter.acquire() if self.limiter else None
+            outcome = "error"
+            try:
+                slot = self.ak_pool.acquire(control)
+                self._count("baidu_api_calls_total", labels, control)
+                started = time.perf_counter()
+                try:
+                    response = self.session.get(
+                        f"{self.base_url}{path}",
+                        params=dict(params, ak=slot.ak),
+                        timeout=self.timeout
+                    )
+                    result = response.json()
+                except Exception:
+                    self._count("baidu_api_errors_total", labels, control)
+                    raise
+                outcome = "throttled" if result.get("status") in CONCURRENCY_STATUS else "ok"
+            finally:
+                if self.limiter and self.limiter.release(ticket, outcome):
+                    self.metrics.inc("concurrency_backoffs_total")
+            elapsed = time.perf_counter() - started
+            self.metrics.observe("baidu_api_latency_seconds", elapsed, labels)
+            self._count("baidu_api_status_total", dict(labels, status=result.get("status")), control)
+            if self.on_call:
+                self.on_call(path, elapsed, result.get("status"))
+            if not self.ak_pool.report(slot, result.get("status"), park_on_concurrency=not self.limiter):
+                return result
+            if result.get("status") in CONCURRENCY_STATUS:
+                throttled += 1
+                if throttled > MAX_THROTTLE_RETRIES:
+                    self._count("baidu_api_throttle_exhausted_total", labels, control)
+                    raise ThrottledError(f"并发超限，重试{MAX_THROTTLE_RETRIES}次后仍失败")
+                delay = self._throttle_backoff(throttled)
+                if control:
+                    control.sleep(delay)
+                else:
+                    time.sleep(delay)
+
+    def _count(self, name, labels=None, control=None):
+        """
+        计数器加一；任务控制带有自己的指标注册表（JobControl.metrics）时同时计入，
+        多个任务共用同一客户端时各任务的请求速率与缓存命中率按任务统计
+        """
+        self.metrics.inc(name, labels)
+        job_metrics = getattr(control, "metrics", None)
+        if job_metrics is not None and job_metrics is not self.metrics:
+            job_metrics.inc(name, labels)
+
+    @staticmethod
+    def _throttle_backoff(attempt):
+        """第 attempt 次并发超限后的等待时间：指数增长，取其 50%~100% 的随机值，避免各线程同时重试"""
+        delay = min(MAX_THROTTLE_BACKOFF, THROTTLE_BACKOFF * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def get_location_data(self, address, config_items, plan=None, control=None):
         """
         获取原始API数据
+        :param plan: 预先生成的 QueryPlan，不传时按 config_items 现场生成
+        :param control: job_control.JobControl，任务取消后进行中的请求不再重试，抛出 JobCancelled
         :return: {
             "coordinates": (lng, lat),
             "formatted_address": "详细地址",
@@ -38,142 +201,330 @@ class BaiduMapClient:
         }
         """
         # 地理编码
-        coord = self._geocode(address)
+        coord = self._geocode(address, control)
         if not coord:
             return None
 
-        # 反向地理编码获取详细地址
-        address_info = self._reverse_geocode(coord)
+        plan = plan or QueryPlan(config_items)
+
+        # 网格吸附：以网格中心为检索中心，半径外扩最大吸附误差
+        center, margin = coord, 0
+        if self.snapper:
+            center, margin = self.snapper.snap(coord), self.snapper.margin
+
+        # 反向地理编码与各检索词互不依赖，全部并行提交；相同 (检索词, 半径) 只请求一次
+        address_future = self._executor.submit(self._reverse_geocode, coord, control)
+        query_futures = [
+            self._executor.submit(self._search_radii, query, center, radii, margin, control)
+            for query, radii in plan.search_groups.items()
+        ]
+        results = {}
+        for future in query_futures:
+            results.update(future.result())
 
-        # 收集所有启用的字段数据
-        field_data = {}
-        for item in config_items:
-            if item['enabled']:
-                field_data[item['name']] = self._get_field_data(item, coord)
+        # 检索失败（重试后仍出错）时整个地址视为失败：不写入断点日志，重新运行时再获取，
+        # 避免把失败当作"周边没有该类POI"写进报告
+        failed = sorted({query for (query, _), pois in results.items() if pois is None})
+        if failed:
+            print(f"{address}: {'、'.join(failed)}检索失败，本地址暂不输出")
+            self._count("addresses_failed_total", control=control)
+            return None
+
+        # 分发到各字段，保持输出结构不变
+        field_data = plan.assemble(results)
+        address_info = address_future.result()
+        if not address_info:
+            print(f"{address}: 反向地理编码失败，本地址暂不输出")
+            self._count("addresses_failed_total", control=control)
+            return None
 
-        return {
+        data = {
             "coordinates": coord,
             "formatted_address": address_info['formatted_address'],
             "district": address_info.get('district', ''),
             "field_data": field_data
         }
+        if self.snapper:
+            # POI距离相对于检索中心，由 DataProcessor 按真实坐标重新计算并过滤
+            data["search_center"] = center
+        return data
+
+    def _search_radii(self, query, coord, radii, margin=0, control=None):
+        """
+        同一检索词的多个半径按从大到小依次检索，
+        大半径结果未截断时，小半径直接由缓存推导
+        :param margin: 网格吸附时的半径外扩量（米），结果仍按原半径分发
+        """
+        return {(query, radius): self._search_poi(query, coord, int(radius) + margin, control)
+                for radius in radii}
 
-    def _geocode(self, address):
-        """地理编码（带缓存）"""
-        if address in self.geocode_cache:
-            return self.geocode_cache[address]
+    def _geocode(self, address, control=None):
+        """地理编码（带缓存，缓存键与请求地址均为归一化后的写法）"""
+        query = self.normalizer.normalize(address) if self.normalizer else ""
+        query = query or address.strip()
+        coord = self._cached("geocode", query, lambda: self._fetch_geocode(query, control), control)
+        return tuple(coord) if coord else None
 
+    def _fetch_geocode(self, address, control=None):
         params = {
             "address": address,
-            "output": "json",
-            "ak": self.ak
+            "output": "json"
         }
         try:
-            response = requests.get("https://api.map.baidu.com/geocoding/v3", params=params)
-            result = response.json()
+            result = self._request("/geocoding/v3", params, control)
             if result['status'] == 0:
                 loc = result['result']['location']
-                coord = (loc['lng'], loc['lat'])
-                self.geocode_cache[address] = coord
-                return coord
+                return (loc['lng'], loc['lat'])
             return None
+        except (QuotaExhaustedError, JobCancelled):
+            raise
         except Exception as e:
             print(f"Geocoding error: {str(e)}")
             return None
 
-    def _reverse_geocode(self, coord):
+    def _reverse_geocode(self, coord, control=None):
         """反向地理编码（带缓存）"""
-        cache_key = f"rev|{coord[0]},{coord[1]}"
-        if cache_key in self.poi_cache:
-            return self.poi_cache[cache_key]
+        cache_key = self._coord_key(coord)
+        data = self._cached("reverse_geocode", cache_key, lambda: self._fetch_reverse_geocode(coord, control), control)
+        return data if data is not None else {}
 
+    def _fetch_reverse_geocode(self, coord, control=None):
         params = {
             "location": f"{coord[1]},{coord[0]}",
             "output": "json",
-            "ak": self.ak,
             "coordtype": "bd09ll"
         }
         try:
-            response = requests.get("https://api.map.baidu.com/reverse_geocoding/v3", params=params)
-            result = response.json()
+            result = self._request("/reverse_geocoding/v3", params, control)
             if result['status'] == 0:
-                data = {
+                return {
                     "formatted_address": result['result']['formatted_address'],
                     "district": result['result']['addressComponent']['district']
                 }
-                self.poi_cache[cache_key] = data
-                return data
-            return {}
+            return None
+        except (QuotaExhaustedError, JobCancelled):
+            raise
         except Exception as e:
             print(f"Reverse geocode error: {str(e)}")
-            return {}
-
-    def _get_field_data(self, config_item, coord):
-        """获取单个字段的原始数据"""
-        field_name = config_item['name']
-        radius = config_item.get('radius', 1000)
-
-        # 字段处理映射
-        handlers = {
-            "位置": lambda: None,  # 由反向地理编码处理
-            "距最近商服中心的距离(公里)": lambda: self._search_poi("商场", coord, radius),
-            "商服网点聚集程度": lambda: {
-                "商场": self._search_poi("商场", coord, radius),
-                "超市": self._search_poi("超市", coord, radius),
-                "便利店": self._search_poi("便利店", coord, radius)
-            },
-            "客流数量": lambda: self._search_poi("学校", coord, radius),
-            "居住氛围": lambda: self._search_poi("小区", coord, radius),
-            "道路通达程度": lambda: self._search_poi("道路", coord, radius),
-            "临街（路）状况": lambda: self._search_poi("道路", coord, radius),
-            "X米半径范围内公共交通线路数": lambda: self._search_poi("公交", coord, radius),
-            "距公交站点距离（米）": lambda: self._search_poi("公交站", coord, radius),
-            "距轨道站点距离（米）": lambda: self._search_poi("地铁站", coord, radius),
-            "公用设施条件(公里)": lambda: {
-                "医院": self._search_poi("医院", coord, radius),
-                "学校": self._search_poi("学校", coord, radius),
-                "银行": self._search_poi("银行", coord, radius),
-                "公园": self._search_poi("公园", coord, radius)
-            },
-            "距商务中心的距离(公里)": lambda: self._search_poi("商务中心", coord, radius),
-            "商务聚集程度": lambda: self._search_poi("写字楼", coord, radius),
-            "距火车站的距离(公里)": lambda: self._search_poi("火车站", coord, radius),
-            "距最近货运火车站的距离(公里)": lambda: self._search_poi("货运站", coord, radius),
-            "距最近货运港口的距离(公里)": lambda: self._search_poi("港口", coord, radius),
-            "距长途车站/客运站点距离(公里)": lambda: self._search_poi("汽车站", coord, radius),
-            "距机场的距离(公里)": lambda: self._search_poi("机场", coord, radius),
-            "距高速公路出入口的距离(公里)": lambda: self._search_poi("高速出口", coord, radius)
-        }
+            return None
 
-        return handlers[field_name]()
-        print(f"API原始响应: {json.dumps(result, ensure_ascii=False)}")
+    def _search_poi(self, query, coord, radius, control=None):
+        """
+        POI搜索（带缓存）
+        同一检索词、同一坐标的结果按半径存放在一条缓存记录中：
+        {"半径": {"total": 总数, "results": [...], "pages": 请求页数, "fetched_at": 获取时间}}
+        每加入一个半径整条记录会重新写入，记录的有效期随之刷新，因此各半径按自己的 fetched_at 判断是否过期
+        小半径检索可以由任一未截断的更大半径结果按距离过滤得到，无需再次请求
+        配置了离线POI后端时直接查本地索引
+        """
+        if self.poi_backend is not None:
+            self._count("poi_index_queries_total", control=control)
+            return self.poi_backend.search_poi(query, coord, int(radius))
 
-    def _search_poi(self, query, coord, radius):
-        """POI搜索（带缓存）"""
-        cache_key = f"{query}|{coord}|{radius}"
-        if cache_key in self.poi_cache:
-            return self.poi_cache[cache_key]
+        cache_key = f"{query}|{self._coord_key(coord)}"
+        radius = int(radius)
+
+        def lookup():
+            entry = self.cache.get("poi", cache_key)
+            return self._derive_pois(entry, radius) if entry else None
+
+        def fetch():
+            page = self._fetch_poi(query, coord, radius, control)
+            if page is None:
+                return None
+            with self._stats_lock:
+                stats = self._page_stats.setdefault((query, radius), [0, 0])
+                stats[0] += 1
+                stats[1] += page.get("pages", 1)
+            # 复制后再写入：MemoryCache 返回的是共享对象，其他线程可能正在 _derive_pois 中遍历它
+            now = time.time()
+            entry = {
+                cached_radius: cached_page
+                for cached_radius, cached_page in (self.cache.get("poi", cache_key) or {}).items()
+                if self._fresh(cached_page, now)
+            }
+            entry[str(radius)] = dict(page, fetched_at=now)
+            self.cache.set("poi", cache_key, entry)
+            return page["results"]
 
+        # 失败时返回None（区别于"半径内没有POI"的空列表）
+        return self._single_flight(("poi", cache_key), lookup, fetch, control)
+
+    def _derive_pois(self, entry, radius):
+        """从缓存记录中取出指定半径的结果；优先精确命中，其次由最小的可用大半径结果过滤（跳过已过期的半径）"""
+        now = time.time()
+        entry = {r: page for r, page in entry.items() if self._fresh(page, now)}
+        exact = entry.get(str(radius))
+        if exact and (self._complete(exact) or not self._needs_more_pages(exact)):
+            return exact["results"]
+
+        for cached_radius in sorted(int(r) for r in entry if int(r) > radius):
+            page = entry[str(cached_radius)]
+            results = page["results"]
+            # 结果被截断（只拿到部分POI）时，小半径内可能还有未返回的POI，不能推导
+            if not self._complete(page):
+                continue
+            # 缺少距离信息时无法判断是否在小半径内
+            if any("distance" not in poi.get("detail_info", {}) for poi in results):
+                continue
+            return [poi for poi in results if poi["detail_info"]["distance"] <= radius]
+        return None
+
+    def _fresh(self, page, now):
+        """
+        缓存中某个半径的结果是否仍在 poi 有效期内
+        缺少 fetched_at 的旧记录按整条记录的有效期处理
+        """
+        ttl = getattr(self.cache, "ttl", {}).get("poi")
+        fetched_at = page.get("fetched_at")
+        return not ttl or fetched_at is None or fetched_at >= now - ttl
+
+    @staticmethod
+    def _complete(page):
+        return page.get("total", 0) <= len(page["results"])
+
+    def _needs_more_pages(self, page):
+        """分页模式下，缓存中截断的结果页数少于当前配置时需要重新检索"""
+        if not self.paginate:
+            return False
+        wanted = min(math.ceil(page.get("total", 0) / PAGE_SIZE), self.max_pages)
+        return page.get("pages", 1) < wanted
+
+    def _fetch_poi(self, query, coord, radius, control=None):
+        """
+        请求POI检索接口
+        :return: {"total": 总数, "results": 按距离排序的POI, "pages": 请求页数}，
+                 任一页失败返回None
+        """
         params = {
             "query": query,
             "location": f"{coord[1]},{coord[0]}",
             "radius": radius,
             "output": "json",
-            "ak": self.ak,
             "scope": 2
         }
+        if self.paginate:
+            params.update(page_size=PAGE_SIZE, page_num=0)
+
+        first = self._fetch_poi_page(params, control)
+        if first is None:
+            return None
+        total = first.get("total", len(first["results"]))
+        results = list(first["results"])
+        pages = 1
+
+        if self.paginate:
+            # 根据第一页的total并发获取剩余页，受 max_pages 限制
+            page_count = min(math.ceil(total / PAGE_SIZE), self.max_pages)
+            futures = [
+                self._page_executor.submit(self._fetch_poi_page, dict(params, page_num=page_num), control)
+                for page_num in range(1, page_count)
+            ]
+            later_pages = [future.result() for future in futures]
+            # 任一页失败时整个检索视为失败：不缓存缺页的结果，否则在有效期内都不会补齐
+            if any(page is None for page in later_pages):
+                return None
+            for page in later_pages:
+                pages += 1
+                results.extend(page["results"])
+
+            # 翻页期间数据可能变化，按uid去重
+            seen = set()
+            unique = []
+            for poi in results:
+                uid = poi.get("uid")
+                if uid is None or uid not in seen:
+                    seen.add(uid)
+                    unique.append(poi)
+            results = unique
+
+        # 按距离排序
+        results.sort(key=lambda x: x['detail_info'].get('distance', float('inf')))
+        return {"total": total, "results": results, "pages": pages}
+
+    def _fetch_poi_page(self, params, control=None):
         try:
-            response = requests.get("https://api.map.baidu.com/place/v2/search", params=params)
-            result = response.json()
+            result = self._request("/place/v2/search", params, control)
             if result['status'] == 0:
-                # 按距离排序
-                sorted_pois = sorted(
-                    result['results'],
-                    key=lambda x: x['detail_info'].get('distance', float('inf'))
-                )
-                self.poi_cache[cache_key] = sorted_pois
-                return sorted_pois
-            return []
+                return result
+            return None
+        except (QuotaExhaustedError, JobCancelled):
+            raise
         except Exception as e:
             print(f"POI search error: {str(e)}")
-            return []
+            return None
+
+    def pagination_report(self, plan):
+        """
+        各字段的翻页统计（多个字段共享的检索会计入每个使用它的字段）
+        :return: {字段名: {"pages": 请求页数, "extra_calls": 翻页额外消耗的请求数}}
+        """
+        with self._stats_lock:
+            stats = {key: list(value) for key, value in self._page_stats.items()}
+        margin = self.snapper.margin if self.snapper else 0
+        report = {}
+        for name, spec, radius in plan.fields:
+            pages = extra = 0
+            for query in plan.spec_queries(spec):
+                searches, page_count = stats.get((query, int(radius) + margin), (0, 0))
+                pages += page_count
+                extra += page_count - searches
+            report[name] = {"pages": pages, "extra_calls": extra}
+        return report
+
+    @staticmethod
+    def _coord_key(coord):
+        """坐标归一化为缓存键（保留6位小数，约0.1米）"""
+        return f"{float(coord[0]):.6f},{float(coord[1]):.6f}"
+
+    def _cached(self, namespace, key, fetch, control=None):
+        """线程安全的缓存读取；未命中时请求并写入缓存（失败结果None不写入）"""
+        def fetch_and_store():
+            value = fetch()
+            if value is not None:
+                self.cache.set(namespace, key, value)
+            return value
+
+        return self._single_flight(
+            (namespace, key),
+            lambda: self.cache.get(namespace, key),
+            fetch_and_store,
+            control
+        )
+
+    def _single_flight(self, inflight_key, lookup, fetch, control=None):
+        """
+        并发请求同一个键时只有一个线程真正发起请求，其余线程等待后重新查缓存
+        :param lookup: 查缓存，未命中返回None
+        :param fetch: 发起请求并写缓存，失败返回None
+        """
+        cache_name = inflight_key[0]
+        waited = False
+        while True:
+            value = lookup()
+            if value is not None:
+                result = "coalesced" if waited else "hit"
+                self._count("cache_lookups_total", {"cache": cache_name, "result": result}, control)
+                return value
+            with self._inflight_lock:
+                event = self._inflight.get(inflight_key)
+                if event is None:
+                    event = self._inflight[inflight_key] = threading.Event()
+                    break
+            # 其他线程正在请求同一个键，等待其完成后重新读取缓存
+            waited = True
+            event.wait()
+
+        try:
+            # 等待锁期间其他线程可能刚好写入
+            value = lookup()
+            if value is None:
+                self._count("cache_lookups_total", {"cache": cache_name, "result": "miss"}, control)
+                value = fetch()
+            else:
+                self._count("cache_lookups_total", {"cache": cache_name, "result": "hit"}, control)
+            return value
+        finally:
+            with self._inflight_lock:
+                del self._inflight[inflight_key]
+            event.set()
@@ -0,0 +1,149 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+端到端压测：启动本地模拟服务（mock_server），用与GUI/命令行相同的 Pipeline 处理生成的模板，
+统计吞吐量（地址/秒）、单次请求延迟分位数与请求总数，用于客观比较并发、缓存等改动的效果。
+
+用法：
+    python src/cli.py benchmark --addresses 200 --workers 8 --latency 50
+"""
+
+import os
+import csv
+import math
+import time
+import tempfile
+import threading
+
+from query_planner import FIELD_QUERIES
+from mock_server import MockBaiduServer
+
+BENCHMARK_AK = "benchmark"
+# 压测时AK限流放宽，避免测到的只是限流速度
+BENCHMARK_QPS = 10000
+
+
+def default_config(max_workers=8):
+    """启用全部字段的压测配置"""
+    items = [
+        {"name": name, "enabled": True, "radius": 1000, "display_index": index, "original_index": index}
+        for index, name in enumerate(FIELD_QUERIES)
+    ]
+    return {"config": {"ak": BENCHMARK_AK, "max_workers": max_workers, "items": items, "comparisons": {}}}
+
+
+def make_template(path, addresses, group_size=5):
+    """生成压测模板：addresses 个不同小区，每 group_size 个一组"""
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["分组", "小区", "类型"])
+        for i in range(addresses):
+            writer.writerow([str(i // group_size + 1), f"压测小区{i + 1}号", "案例" if i % group_size == 0 else "可比实例"])
+
+
+def percentile(values, q):
+    """最近秩分位数，values 需已排序"""
+    if not values:
+        return 0.0
+    # 最小的 k 使得至少 q% 的样本 <= values[k-1]
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+class LatencyRecorder:
+    """作为 BaiduMapClient 的 on_call 回调，记录每次请求的耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+        self.by_path = {}
+
+    def __call__(self, path, seconds, status):
+        with self._lock:
+            self.samples.append(seconds)
+            self.by_path[path] = self.by_path.get(path, 0) + 1
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self.samples)
+        return {
+            "calls": len(samples),
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p95_ms": percentile(samples, 95) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000,
+        }
+
+
+def run_benchmark(config=None, addresses=200, latency=20, jitter=5, error_rate=0.0,
+                  concurrency_error_rate=0.0, qps=BENCHMARK_QPS, max_concurrency=None):
+    """
+    :param config: 基础配置（字段、并发数等），不传时启用全部字段；AK、接口地址、缓存与断点日志会被覆盖
+    :return: 压测报告 dict
+    """
+    from pipeline import Pipeline, build_client
+
+    config = config or default_config()
+    options = config["config"]
+    options.update(
+        ak_pool=[{"ak": BENCHMARK_AK, "qps": qps}],
+        cache={"enabled": False},
+        journal={"enabled": False}
+    )
+    recorder = LatencyRecorder()
+
+    with MockBaiduServer(latency=latency, jitter=jitter, error_rate=error_rate,
+                         concurrency_error_rate=concurrency_error_rate,
+                         max_concurrency=max_concurrency) as server, \
+            tempfile.TemporaryDirectory() as workdir:
+        options["base_url"] = server.url
+        template_path = os.path.join(workdir, "template.csv")
+        make_template(template_path, addresses)
+
+        client = build_client(config, on_call=recorder)
+        try:
+            started = time.perf_counter()
+            Pipeline(config, template_path, os.path.join(workdir, "report.xlsx"), client=client).run()
+            elapsed = time.perf_counter() - started
+        finally:
+            client.close()
+        server_calls = dict(server.calls)
+
+    report = {
+        "addresses": addresses,
+        "max_workers": options.get("max_workers"),
+        "elapsed_s": elapsed,
+        "addresses_per_s": addresses / elapsed if elapsed else 0.0,
+    }
+    report.update(recorder.summary())
+    report["throttled"] = client.metrics.total("baidu_api_status_total", status=401)
+    report["concurrency_backoffs"] = client.metrics.total("concurrency_backoffs_total")
+    if client.limiter:
+        report["concurrency_limit"] = client.limiter.limit
+    report["calls_by_path"] = server_calls
+    return report
+
+
+def format_report(report):
+    lines = [
+        f"地址数: {report['addresses']}  并发数: {report['max_workers']}",
+        f"耗时: {report['elapsed_s']:.2f}s  吞吐量: {report['addresses_per_s']:.1f} 地址/秒",
+        f"请求数: {report['calls']}  延迟 p50/p95/p99: "
+        f"{report['p50_ms']:.1f}/{report['p95_ms']:.1f}/{report['p99_ms']:.1f} ms",
+        f"并发超限: {report['throttled']}次  并发回退: {report['concurrency_backoffs']}次"
+        + (f"  最终并发上限: {report['concurrency_limit']}" if "concurrency_limit" in report else ""),
+    ]
+    for path, count in sorted(report["calls_by_path"].items()):
+        lines.append(f"  {path}: {count}")
+    return "\n".join(lines)
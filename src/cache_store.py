@@ -0,0 +1,232 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# 本地数据目录
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser("~"), ".baidumap_searchtool")
+DEFAULT_CACHE_PATH = os.path.join(DEFAULT_DATA_DIR, "cache.sqlite3")
+
+# 各接口缓存有效期（秒）
+DEFAULT_TTL = {
+    "geocode": 30 * 86400,
+    "reverse_geocode": 30 * 86400,
+    "poi": 7 * 86400,
+}
+DEFAULT_MAX_ENTRIES = 500000
+
+# 每写入多少条检查一次容量
+EVICT_CHECK_INTERVAL = 1000
+# 命中时只在内存中记录访问时间，积累到这么多条或淘汰前批量写回
+ACCESS_FLUSH_INTERVAL = 1000
+
+
+class MemoryCache:
+    """进程内缓存（进程退出即失效）"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            return self._data.get((namespace, key))
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._data[(namespace, key)] = value
+
+    def close(self):
+        pass
+
+
+class SQLiteCache:
+    """
+    SQLite持久化缓存（WAL模式）
+    - 按 (namespace, key) 存储JSON值，namespace 对应接口名
+    - 每个接口单独的有效期，过期记录读取时视为未命中
+    - 超过容量上限时按最近访问时间淘汰；命中时的访问时间批量写回，读取不产生提交
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        # 尚未写回的访问时间 {(namespace, key): accessed_at}
+        self._accessed = {}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)")
+        self._conn.commit()
+        self.purge_expired()
+
+    def get(self, namespace, key):
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                    (namespace, key)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # 数据库被其他进程锁定等情况按未命中处理
+                return None
+            if row is None:
+                return None
+            value, created_at = row
+            if self._expired(namespace, created_at, now):
+                return None
+            self._accessed[(namespace, key)] = now
+            if len(self._accessed) >= ACCESS_FLUSH_INTERVAL:
+                self._flush_accessed()
+        return json.loads(value)
+
+    def set(self, namespace, key, value):
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, payload, now, now)
+            )
+            self._conn.commit()
+            self._accessed.pop((namespace, key), None)
+            self._writes += 1
+            if self._writes % EVICT_CHECK_INTERVAL == 0:
+                self._evict()
+
+    def purge_expired(self):
+        """删除所有已过期记录"""
+        now = time.time()
+        with self._lock:
+            for namespace, ttl in self.ttl.items():
+                if ttl:
+                    self._conn.execute(
+                        "DELETE FROM cache WHERE namespace = ? AND created_at < ?",
+                        (namespace, now - ttl)
+                    )
+            self._evict()
+            self._conn.commit()
+
+    def export_to(self, path):
+        """导出缓存为独立的SQLite文件，便于共享预热好的缓存"""
+        if os.path.exists(path):
+            os.remove(path)
+        with self._lock:
+            target = sqlite3.connect(path)
+            try:
+                self._conn.backup(target)
+            finally:
+                target.close()
+
+    def import_from(self, path):
+        """
+        合并其他缓存文件（同键保留较新的记录）
+        :return: 导入的记录数
+        """
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("ATTACH DATABASE ? AS src", (path,))
+            try:
+                self._conn.execute("""
+                    INSERT OR REPLACE INTO cache (namespace, key, value, created_at, accessed_at)
+                    SELECT s.namespace, s.key, s.value, s.created_at, s.accessed_at
+                    FROM src.cache AS s
+                    LEFT JOIN cache AS c ON c.namespace = s.namespace AND c.key = s.key
+                    WHERE c.key IS NULL OR s.created_at > c.created_at
+                """)
+                self._conn.commit()
+            finally:
+                self._conn.execute("DETACH DATABASE src")
+            imported = self._conn.total_changes - before
+            self._evict()
+            self._conn.commit()
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self._conn.close()
+
+    def _expired(self, namespace, created_at, now):
+        ttl = self.ttl.get(namespace)
+        return bool(ttl) and created_at < now - ttl
+
+    def _flush_accessed(self):
+        """批量写回命中记录的访问时间（调用方需持有锁），失败时保留待下次写回"""
+        if not self._accessed:
+            return
+        try:
+            self._conn.executemany(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                [(accessed_at, namespace, key)
+                 for (namespace, key), accessed_at in self._accessed.items()]
+            )
+            self._conn.commit()
+        except sqlite3.OperationalError:
+            self._conn.rollback()
+            return
+        self._accessed.clear()
+
+    def _evict(self):
+        """按最近访问时间淘汰超出容量的记录（调用方需持有锁）"""
+        self._flush_accessed()
+        if not self.max_entries:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE rowid IN "
+                "(SELECT rowid FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+            self._conn.commit()
+
+
+def open_cache(options=None):
+    """
+    根据配置创建缓存
+    :param options: config["config"]["cache"]，如 {"enabled": true, "path": "...", "ttl": {"poi": 86400}}
+    """
+    options = options or {}
+    if not options.get("enabled", True):
+        return MemoryCache()
+    return SQLiteCache(
+        path=options.get("path") or DEFAULT_CACHE_PATH,
+        ttl=options.get("ttl"),
+        max_entries=options.get("max_entries", DEFAULT_MAX_ENTRIES)
+    )
@@ -0,0 +1,246 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+命令行批处理入口（不依赖Qt，可在服务器/定时任务中运行）
+
+用法：
+    python src/cli.py run --config config.json --input 模板.xlsx --output 结果.xlsx
+    python src/cli.py run --config config.json --input 模板.xlsx --output 结果.xlsx --shards 4
+    python src/cli.py shard --config config.json --input 模板.xlsx --index 0 --count 4 --output 分片0.jsonl
+    python src/cli.py merge --config config.json --input 模板.xlsx --output 结果.xlsx 分片*.jsonl
+    python src/cli.py serve --config config.json --watch 待处理/
+    python src/cli.py build-index --input poi.csv --output poi_index/
+    python src/cli.py benchmark --addresses 200 --latency 50
+"""
+
+import argparse
+import contextlib
+import json
+import signal
+import sys
+import time
+
+
+def load_config(path, ak=None, max_workers=None):
+    """读取"导出配置"生成的JSON配置文件，可用命令行参数覆盖AK与并发数"""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if "config" not in config:
+        raise ValueError("无效的配置文件格式")
+    if ak:
+        config["config"]["ak"] = ak
+        config["config"].pop("ak_pool", None)
+    if max_workers:
+        config["config"]["max_workers"] = max_workers
+    if not config["config"].get("ak") and not config["config"].get("ak_pool"):
+        raise ValueError("配置文件中缺少AK，请在配置中填写或使用 --ak 参数")
+    return config
+
+
+def print_progress(event):
+    """打印结构化进度（progress.ProgressEvent）：环节、完成数、速率、缓存命中率与剩余时间"""
+    from progress import format_event
+
+    print(f"[{event.percent:3d}%] {format_event(event)}", file=sys.stderr, flush=True)
+
+
+def cmd_run(args):
+    # 延迟导入：解析参数、输出帮助时不加载网络与数据处理模块
+    from pipeline import Pipeline
+    from job_control import JobControl, JobCancelled
+
+    config = load_config(args.config, ak=args.ak, max_workers=args.workers)
+    if args.metrics or args.prometheus:
+        config["config"]["metrics"] = {"json": args.metrics, "prometheus": args.prometheus}
+
+    # 第一次 Ctrl+C：停止派发并等待进行中的地址完成（保留断点）；再次 Ctrl+C 立即退出
+    control = JobControl()
+
+    def handle_interrupt(signum, frame):
+        if control.cancelled:
+            raise KeyboardInterrupt
+        print("正在取消，等待进行中的地址完成（再按一次 Ctrl+C 立即退出）...", file=sys.stderr, flush=True)
+        control.cancel()
+
+    if args.shards and args.shards > 1:
+        from sharding import run_sharded
+
+        run_sharded(config, args.input, args.output, args.shards, workdir=args.shard_dir)
+        print(f"已生成: {args.output}")
+        return 0
+
+    previous = signal.signal(signal.SIGINT, handle_interrupt)
+    try:
+        Pipeline(config, args.input, args.output, progress_event_callback=print_progress, control=control).run()
+    except JobCancelled:
+        print("已取消，已获取的数据保存在断点日志中，重新运行相同命令将跳过这些地址", file=sys.stderr)
+        return 130
+    finally:
+        signal.signal(signal.SIGINT, previous)
+    print(f"已生成: {args.output}")
+    return 0
+
+
+def cmd_shard(args):
+    from sharding import fetch_shard
+
+    config = load_config(args.config, ak=args.ak, max_workers=args.workers)
+    fetched = fetch_shard(
+        config, args.input, args.index, args.count, args.output, progress_event_callback=print_progress
+    )
+    print(f"已生成分片{args.index}/{args.count}: {args.output}（{fetched}个地址）")
+    return 0
+
+
+def cmd_merge(args):
+    from sharding import merge_shards
+
+    config = load_config(args.config)
+    merge_shards(config, args.input, args.shards, args.output, progress_event_callback=print_progress)
+    print(f"已生成: {args.output}")
+    return 0
+
+
+def cmd_serve(args):
+    from job_server import JobServer
+
+    config = load_config(args.config, ak=args.ak, max_workers=args.workers)
+    server = JobServer(
+        config, work_dir=args.work_dir, max_jobs=args.jobs, watch_dir=args.watch, host=args.host, port=args.port
+    )
+    server.start()
+    print(f"任务服务已启动: {server.url}", file=sys.stderr)
+    if args.watch:
+        print(f"监视目录: {args.watch}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("正在停止，等待进行中的地址完成...", file=sys.stderr)
+    finally:
+        server.stop()
+    return 0
+
+
+def cmd_build_index(args):
+    from poi_index import PoiIndex
+
+    index = PoiIndex.from_file(args.input, cell_size=args.cell_size)
+    index.save(args.output)
+    print(f"已建立离线POI索引: {args.output}（{len(index)}个POI）")
+    return 0
+
+
+def cmd_benchmark(args):
+    from benchmark import run_benchmark, default_config, format_report, BENCHMARK_AK
+
+    config = load_config(args.config, ak=BENCHMARK_AK) if args.config else default_config()
+    if args.workers:
+        config["config"]["max_workers"] = args.workers
+    # 运行期间的提示（请求失败、AK停用等）写到stderr，stdout只输出报告，--json 时可直接解析
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark(
+            config,
+            addresses=args.addresses,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            concurrency_error_rate=args.concurrency_error_rate,
+            max_concurrency=args.max_concurrency
+        )
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="baidumap-searchtool", description="百度地图批量检索（命令行模式）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="处理一个模板文件并生成Excel报告")
+    run.add_argument("--config", required=True, help="配置文件（GUI中\"导出配置\"生成的JSON）")
+    run.add_argument("--input", required=True, help="模板文件（.xlsx/.xls/.csv/.parquet）")
+    run.add_argument("--output", required=True, help="输出的Excel文件")
+    run.add_argument("--ak", help="覆盖配置文件中的AK")
+    run.add_argument("--workers", type=int, help="覆盖配置文件中的并发数")
+    run.add_argument("--metrics", help="运行结束后把指标（请求数、延迟、缓存命中、各环节耗时）写入该JSON文件")
+    run.add_argument("--prometheus", help="运行结束后把指标以Prometheus文本格式写入该文件")
+    run.add_argument("--shards", type=int, help="按地址分成N片，在N个进程中获取后合并（各进程均分AK的QPS与配额）")
+    run.add_argument("--shard-dir", help="分片文件目录，默认与输出文件同目录")
+    run.set_defaults(func=cmd_run)
+
+    shard = subparsers.add_parser("shard", help="只获取一个分片的地址并写入分片文件（可在多台机器上分别运行）")
+    shard.add_argument("--config", required=True, help="配置文件（GUI中\"导出配置\"生成的JSON）")
+    shard.add_argument("--input", required=True, help="模板文件（.xlsx/.xls/.csv/.parquet）")
+    shard.add_argument("--index", type=int, required=True, help="分片序号，从0开始")
+    shard.add_argument("--count", type=int, required=True, help="分片总数")
+    shard.add_argument("--output", required=True, help="输出的分片文件（.jsonl）")
+    shard.add_argument("--ak", help="覆盖配置文件中的AK（各机器可使用各自的AK）")
+    shard.add_argument("--workers", type=int, help="覆盖配置文件中的并发数")
+    shard.set_defaults(func=cmd_shard)
+
+    merge = subparsers.add_parser("merge", help="合并全部分片文件并生成Excel报告")
+    merge.add_argument("--config", required=True, help="配置文件（与获取分片时的字段与半径一致）")
+    merge.add_argument("--input", required=True, help="模板文件")
+    merge.add_argument("--output", required=True, help="输出的Excel文件")
+    merge.add_argument("shards", nargs="+", help="分片文件")
+    merge.set_defaults(func=cmd_merge)
+
+    serve = subparsers.add_parser("serve", help="常驻运行任务服务，通过HTTP接口或监视目录接收任务")
+    serve.add_argument("--config", required=True, help="服务配置（AK、缓存、并发数等），也是任务的默认配置")
+    serve.add_argument("--host", default="127.0.0.1", help="监听地址，默认只接受本机访问")
+    serve.add_argument("--port", type=int, default=8600, help="监听端口，默认8600")
+    serve.add_argument("--watch", help="监视目录：放入模板（可附带同名 .json 配置）即自动处理")
+    serve.add_argument("--jobs", type=int, default=2, help="同时运行的任务数，默认2")
+    serve.add_argument("--work-dir", help="上传模板与结果的存放目录，默认 ~/.baidumap_searchtool/jobs")
+    serve.add_argument("--ak", help="覆盖配置文件中的AK")
+    serve.add_argument("--workers", type=int, help="覆盖配置文件中的并发数（所有任务共用）")
+    serve.set_defaults(func=cmd_serve)
+
+    build_index = subparsers.add_parser("build-index", help="由POI数据（CSV/GeoJSON）建立离线POI索引")
+    build_index.add_argument("--input", required=True, help="POI数据文件（.csv/.geojson）")
+    build_index.add_argument("--output", required=True, help="索引目录")
+    build_index.add_argument("--cell-size", type=float, default=500, help="网格边长（米），默认500")
+    build_index.set_defaults(func=cmd_build_index)
+
+    benchmark = subparsers.add_parser("benchmark", help="使用本地模拟接口压测完整处理流程（不消耗配额）")
+    benchmark.add_argument("--config", help="配置文件，不传时启用全部字段")
+    benchmark.add_argument("--addresses", type=int, default=200, help="地址数，默认200")
+    benchmark.add_argument("--workers", type=int, help="并发数")
+    benchmark.add_argument("--latency", type=float, default=20, help="模拟接口平均延迟（毫秒），默认20")
+    benchmark.add_argument("--jitter", type=float, default=5, help="延迟抖动（毫秒），默认5")
+    benchmark.add_argument("--error-rate", type=float, default=0.0, help="HTTP 503 的比例")
+    benchmark.add_argument("--concurrency-error-rate", type=float, default=0.0, help="status 401 的比例")
+    benchmark.add_argument("--max-concurrency", type=int, help="模拟接口的并发上限，超出返回401")
+    benchmark.add_argument("--json", action="store_true", help="以JSON输出报告")
+    benchmark.set_defaults(func=cmd_benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        print("已中断", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"处理失败: {str(e)}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import threading
+
+# 健康响应时每个"窗口"（约 limit 个请求）并发上限 +1，并发超限时减半
+DEFAULT_INCREASE = 1.0
+DEFAULT_DECREASE = 0.5
+
+
+class AIMDLimiter:
+    """
+    自适应并发控制（加性增、乘性减）
+    - 每个正常响应使上限增加 increase/limit，即每轮约 limit 个请求后 +increase
+    - 返回并发超限（401/402）时上限乘以 decrease；上次降低之前发出的请求返回的超限不再重复降低
+      （同一批在途请求几乎同时超限时只减一次）
+    - 网络异常不调整上限
+    被限流的请求由调用方重新排队，等待上限允许后再发出，不会被丢弃
+    """
+
+    def __init__(self, limit, min_limit=1, max_limit=None,
+                 increase=DEFAULT_INCREASE, decrease=DEFAULT_DECREASE):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit or limit))
+        self.increase = increase
+        self.decrease = decrease
+        self._limit = float(min(max(limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_config(cls, options, max_workers, pool_size=None):
+        """
+        :param options: 配置中的 adaptive_concurrency，如 {"enabled": true, "min": 1, "max": 16}
+        :return: AIMDLimiter；关闭时返回 None
+        """
+        options = options or {}
+        if not options.get("enabled", True):
+            return None
+        max_limit = options.get("max") or pool_size or max_workers * 2
+        return cls(
+            options.get("initial") or max_limit,
+            min_limit=options.get("min", 1),
+            max_limit=max_limit
+        )
+
+    @property
+    def limit(self):
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        """
+        等待直到在途请求数低于当前上限
+        :return: 发出时间，release 时传回
+        """
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+            return time.monotonic()
+
+    def release(self, ticket, outcome="ok"):
+        """
+        :param ticket: acquire 的返回值
+        :param outcome: "ok" 正常响应、"throttled" 并发超限、"error" 网络异常
+        :return: 本次是否降低了上限
+        """
+        with self._cond:
+            self._in_flight -= 1
+            decreased = False
+            if outcome == "throttled":
+                if ticket >= self._last_decrease:
+                    self._limit = max(self.min_limit, self._limit * self.decrease)
+                    self._last_decrease = time.monotonic()
+                    decreased = True
+            elif outcome == "ok":
+                self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+            self._cond.notify_all()
+            return decreased
@@ -13,47 +13,211 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from geopy.distance import geodesic
 import re
-import json
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+
+from rule_engine import RuleSet
+from metrics import NULL_METRICS
+
+# 距离算法："geodesic"（geopy逐点计算）、"lambert"/"haversine"（geo_distance 向量化批量计算）
+DEFAULT_DISTANCE_BACKEND = "geodesic"
+
+
+# 评分列名后缀
+SCORE_SUFFIX = "评分"
+
+# 编译后的字段：处理函数、单位（公里/米）、编译好的比较规则 RuleSet、是否输出评分列
+CompiledField = namedtuple(
+    "CompiledField", ["name", "handler", "unit", "rules", "original_index", "radius", "scored"]
+)
+
+
+class ProcessingPlan:
+    """
+    由配置编译得到的处理计划，同一配置只需编译一次，
+    process 逐行执行时不再查找处理函数或解析比较规则
+    """
+
+    def __init__(self, fields, distance_backend):
+        self.fields = fields
+        self.distance_backend = distance_backend
+        # 比较规则未覆盖的区间 [(字段名, [(上一等级上界, 下一等级下界), ...]), ...]，落在其中的值没有等级
+        self.rule_gaps = [(field.name, field.rules.gaps) for field in fields if field.rules.gaps]
+        # 输出列顺序：有比较规则的数值字段后紧跟评分列
+        self.columns = ["名称"]
+        for field in fields:
+            self.columns.append(field.name)
+            if field.scored:
+                self.columns.append(field.name + SCORE_SUFFIX)
 
 
 class DataProcessor:
     @staticmethod
-    def process(raw_data, config):
+    def compile(config):
+        """编译处理计划"""
+        fields = []
+        for field_config in DataProcessor._get_enabled_fields(config):
+            name = field_config["name"]
+            rules = RuleSet(
+                config["config"]["comparisons"].get(str(field_config["original_index"]), {}),
+                field_name=name
+            )
+            fields.append(CompiledField(
+                name=name,
+                handler=DataProcessor._get_field_handler(name),
+                unit="公里" if "公里" in name else "米",
+                rules=rules,
+                original_index=field_config["original_index"],
+                radius=field_config.get("radius"),
+                scored=bool(rules) and name in _NUMERIC_FIELDS
+            ))
+        backend = config["config"].get("distance_backend", DEFAULT_DISTANCE_BACKEND)
+        return ProcessingPlan(fields, backend)
+
+    @staticmethod
+    def process(raw_data, config, plan=None, metrics=None):
         """
         完整数据处理入口
         :param raw_data: API原始数据
         :param config: 配置文件
+        :param plan: 预先编译的 ProcessingPlan，不传时按 config 编译
+        :param metrics: metrics.MetricsRegistry，记录加工耗时与行数
         :return: OrderedDict 有序结果
         """
+        metrics = metrics or NULL_METRICS
+        with metrics.timer("process"):
+            processed = DataProcessor._process(raw_data, config, plan)
+        metrics.inc("rows_processed_total", value=len(processed))
+        return processed
+
+    @staticmethod
+    def _process(raw_data, config, plan=None):
+        plan = plan or DataProcessor.compile(config)
         processed = OrderedDict()
-        enabled_fields = DataProcessor._get_enabled_fields(config)
+
+        # 网格吸附获取的数据：POI距离按真实坐标重新计算
+        raw_data = DataProcessor._rebase_snapped(raw_data, plan)
+
+        # 可选：一次性向量化计算全部基准点→POI距离
+        distances = None
+        if plan.distance_backend != "geodesic":
+            distances = DataProcessor._precompute_distances(raw_data, plan)
 
         for address_name, data in raw_data.items():
-            processed[address_name] = OrderedDict()
-            processed[address_name]["名称"] = data.get("title", address_name)
-
-            # 按显示顺序处理每个启用字段
-            for field_config in enabled_fields:
-                field_name = field_config["name"]
-                handler = DataProcessor._get_field_handler(field_name)
-                raw_value = data["field_data"].get(field_name)
-
-                result = handler(
-                    raw_value=raw_value,
-                    base_coord=data["coordinates"],
-                    district=data.get("district", ""),
-                    config=config,
-                    field_config=field_config,
-                    formatted_address=data.get("formatted_address", address_name),
-                    address_name=address_name
+            row = OrderedDict()
+            row["名称"] = data.get("title", address_name)
+            field_data = data["field_data"]
+            base_coord = data["coordinates"]
+            district = data.get("district", "")
+            formatted_address = data.get("formatted_address", address_name)
+
+            # 按显示顺序处理每个启用字段；数值字段先保存 (文本, 数值)，整列评级后再合成文本
+            for field in plan.fields:
+                row[field.name] = field.handler(
+                    raw_value=field_data.get(field.name),
+                    base_coord=base_coord,
+                    district=district,
+                    field=field,
+                    formatted_address=formatted_address,
+                    address_name=address_name,
+                    distances=distances
                 )
-                processed[address_name][field_name] = result
+            processed[address_name] = row
 
+        DataProcessor._apply_levels(processed, plan)
         return processed
 
+    @staticmethod
+    def _apply_levels(processed, plan):
+        """按列应用比较规则：在文本后追加等级，并写入评分列"""
+        rows = list(processed.values())
+        for field in plan.fields:
+            results = [row[field.name] for row in rows]
+            values = [result[1] if isinstance(result, tuple) else None for result in results]
+            levels, scores = field.rules.evaluate_column(values)
+            for row, result, level, score in zip(rows, results, levels, scores):
+                text = result[0] if isinstance(result, tuple) else result
+                row[field.name] = f"{text}，{level}" if level else text
+                if field.scored:
+                    row[field.name + SCORE_SUFFIX] = score if score is not None else ""
+        if any(field.scored for field in plan.fields):
+            # 评分列插入后恢复输出列顺序
+            for row in rows:
+                for column in plan.columns:
+                    row.move_to_end(column)
+
+    @staticmethod
+    def _rebase_snapped(raw_data, plan):
+        """
+        带 search_center 的原始数据（网格吸附检索）：POI的 distance 相对网格中心，
+        按地址真实坐标重新计算距离，过滤掉超出字段半径的POI并重新排序。
+        原始数据可能与缓存共享，这里只生成新的对象，不修改原数据
+        """
+        from geo_distance import pairwise
+        from query_planner import DEFAULT_RADIUS
+
+        if not any(data.get("search_center") for data in raw_data.values()):
+            return raw_data
+
+        def rebase(poi_list, base, radius):
+            if not poi_list:
+                return poi_list
+            located = [poi for poi in poi_list if "location" in poi]
+            meters = pairwise(
+                [base] * len(located),
+                [(poi["location"]["lng"], poi["location"]["lat"]) for poi in located],
+                "lambert"
+            ).tolist()
+            rebased = [
+                dict(poi, detail_info=dict(poi.get("detail_info", {}), distance=round(distance)))
+                for poi, distance in zip(located, meters)
+                if distance <= radius
+            ]
+            rebased.sort(key=lambda poi: poi["detail_info"]["distance"])
+            return rebased
+
+        result = OrderedDict()
+        for address_name, data in raw_data.items():
+            if not data.get("search_center"):
+                result[address_name] = data
+                continue
+            base = tuple(data["coordinates"])
+            field_data = dict(data["field_data"])
+            for field in plan.fields:
+                raw_value = field_data.get(field.name)
+                radius = int(field.radius or DEFAULT_RADIUS)
+                if isinstance(raw_value, dict):
+                    field_data[field.name] = {
+                        query: rebase(poi_list, base, radius) for query, poi_list in raw_value.items()
+                    }
+                elif isinstance(raw_value, list):
+                    field_data[field.name] = rebase(raw_value, base, radius)
+            result[address_name] = dict(data, field_data=field_data)
+        return result
+
+    @staticmethod
+    def _precompute_distances(raw_data, plan):
+        """
+        收集所有字段最近POI的 (基准点, POI) 坐标对，向量化一次算完
+        :return: {(基准经度, 基准纬度, POI经度, POI纬度): 距离(米)}
+        """
+        from geo_distance import pairwise
+
+        pairs = set()
+        for data in raw_data.values():
+            base = tuple(data["coordinates"])
+            for field in plan.fields:
+                raw_value = data["field_data"].get(field.name)
+                poi_lists = raw_value.values() if isinstance(raw_value, dict) else [raw_value]
+                for poi_list in poi_lists:
+                    if isinstance(poi_list, list) and (poi := DataProcessor._get_nearest_poi(poi_list)):
+                        location = poi["location"]
+                        pairs.add(base + (location["lng"], location["lat"]))
+
+        pairs = list(pairs)
+        meters = pairwise([p[:2] for p in pairs], [p[2:] for p in pairs], plan.distance_backend)
+        return dict(zip(pairs, meters.tolist()))
+
     @staticmethod
     def _get_enabled_fields(config):
         """获取并排序已启用的字段配置"""
@@ -62,134 +226,121 @@ class DataProcessor:
 
     @staticmethod
     def _get_field_handler(field_name):
-        """字段处理路由（统一参数适配）"""
-        return {
-            # 距离类字段（全部添加 lambda **kw:）
-            "距轨道站点距离（米）": lambda **kw: DataProcessor._handle_rail_distance(**kw),
-            "距最近商服中心的距离(公里)": lambda **kw: DataProcessor._handle_commercial_center(**kw),
-            "距公交站点距离（米）": lambda **kw: DataProcessor._handle_bus_station(**kw),
-            "公用设施条件(公里)": lambda **kw: DataProcessor._handle_public_facility(**kw),
-            "距商务中心的距离(公里)": lambda **kw: DataProcessor._handle_business_center(**kw),
-            "距火车站的距离(公里)": lambda **kw: DataProcessor._handle_train_station(**kw),
-            "距最近货运火车站的距离(公里)": lambda **kw: DataProcessor._handle_freight_train(**kw),
-            "距最近货运港口的距离(公里)": lambda **kw: DataProcessor._handle_freight_port(**kw),
-            "距长途车站/客运站点距离(公里)": lambda **kw: DataProcessor._handle_bus_terminal(**kw),
-            "距机场的距离(公里)": lambda **kw: DataProcessor._handle_airport(**kw),
-            "距高速公路出入口的距离(公里)": lambda **kw: DataProcessor._handle_highway_exit(**kw),
-
-            # 其他字段（全部添加 lambda **kw:）
-            "商服网点聚集程度": lambda **kw: DataProcessor._handle_commercial_density(**kw),
-            "商务聚集程度": lambda **kw: DataProcessor._handle_business_density(**kw),
-            "客流数量": lambda **kw: DataProcessor._handle_passenger_flow(**kw),
-            "居住氛围": lambda **kw: DataProcessor._handle_residential(**kw),
-            "道路通达程度": lambda **kw: DataProcessor._handle_road_condition(**kw),
-            "临街（路）状况": lambda **kw: DataProcessor._handle_street_condition(**kw),
-            "X米半径范围内公共交通线路数": lambda **kw: DataProcessor._handle_public_transit(**kw),
-
-            # 基础字段
-            "位置": lambda **kw: kw.get("formatted_address", kw.get("address_name", "")),
-        }.get(field_name, lambda **kw: "字段处理未实现")
+        """字段处理路由"""
+        return _FIELD_HANDLERS.get(field_name, DataProcessor._handle_unknown)
+
+    # --------------------------
+    # 基础字段
+    # --------------------------
+    @staticmethod
+    def _handle_location(formatted_address=None, address_name="", **kwargs):
+        """位置"""
+        return formatted_address if formatted_address is not None else address_name
+
+    @staticmethod
+    def _handle_unknown(**kwargs):
+        return "字段处理未实现"
 
     # --------------------------
     # 距离类字段完整实现
     # --------------------------
     @staticmethod
-    def _handle_rail_distance(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_rail_distance(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="地铁站"
         )
 
     @staticmethod
-    def _handle_commercial_center(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_commercial_center(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="商场"
         )
 
     @staticmethod
-    def _handle_bus_station(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_bus_station(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="公交站"
         )
 
     @staticmethod
-    def _handle_business_center(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_business_center(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="商务中心"
         )
 
     @staticmethod
-    def _handle_train_station(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_train_station(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="火车站"
         )
 
     @staticmethod
-    def _handle_freight_train(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_freight_train(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="货运站"
         )
 
     @staticmethod
-    def _handle_freight_port(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_freight_port(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="货运港口"
         )
 
     @staticmethod
-    def _handle_bus_terminal(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_bus_terminal(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="长途汽车站"
         )
 
     @staticmethod
-    def _handle_airport(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_airport(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="机场"
         )
 
     @staticmethod
-    def _handle_highway_exit(raw_value, base_coord, config, field_config, **kwargs):
+    def _handle_highway_exit(raw_value, base_coord, field, **kwargs):
         return DataProcessor._generic_distance_handler(
             poi_list=raw_value,
             base_coord=base_coord,
-            config=config,
-            field_config=field_config,
+            field=field,
+            distances=kwargs.get("distances"),
             poi_type="高速出口"
         )
 
@@ -200,11 +351,12 @@ class DataProcessor:
     def _handle_commercial_density(raw_value, **kwargs):
         """商服网点聚集程度"""
         categories = ["商场", "超市", "便利店"]
-        names = set()
+        # 按类别顺序去重（不用 set：其顺序随进程的哈希种子变化，分片合并与单进程结果会不一致）
+        names = {}
 
         for cat in categories:
             if poi := DataProcessor._get_nearest_poi(raw_value.get(cat, [])):
-                names.add(poi["name"])
+                names.setdefault(poi["name"])
 
         if not names:
             return "无商服网点"
@@ -239,7 +391,7 @@ class DataProcessor:
     @staticmethod
     def _handle_road_condition(raw_value, **kwargs):
         """道路通达程度"""
-        roads = list({p["name"] for p in raw_value[:2]})
+        roads = list(dict.fromkeys(p["name"] for p in raw_value[:2]))
         return f"周边有{'、'.join(roads)}" if roads else "无道路信息"
 
     @staticmethod
@@ -259,7 +411,7 @@ class DataProcessor:
         return f"附近有{'、'.join(sorted(lines)[:5])}等{len(lines)}条公交线路" if lines else "无公交线路"
 
     @staticmethod
-    def _handle_public_facility(raw_value, base_coord, config, field_config,**kwargs):
+    def _handle_public_facility(raw_value, base_coord, field, distances=None, **kwargs):
         """公用设施条件(公里)"""
         categories = ["医院", "学校", "银行", "公园"]
         valid_pois = []
@@ -267,7 +419,7 @@ class DataProcessor:
 
         for cat in categories:
             if poi := DataProcessor._get_nearest_poi(raw_value.get(cat, [])):
-                distance = DataProcessor._calculate_distance(base_coord, poi["location"])
+                distance = DataProcessor._calculate_distance(base_coord, poi["location"], distances)
                 valid_pois.append(poi)
                 total_distance += distance
 
@@ -275,40 +427,29 @@ class DataProcessor:
             return "无公用设施"
 
         avg_distance = total_distance / len(valid_pois)
-        converted_avg = DataProcessor._convert_distance(avg_distance, "公里")
+        value = DataProcessor._round_distance(avg_distance, "公里")
 
         samples = [poi["name"] for poi in valid_pois[:4]]
-        text = f"周边有{'、'.join(samples)}等，平均距离{converted_avg}"
-
-        rules = config["config"]["comparisons"].get(str(field_config["original_index"]), {})
-        level = DataProcessor._apply_comparison(converted_avg, rules)
-        return f"{text}，{level}" if level else text
+        return f"周边有{'、'.join(samples)}等，平均距离{value}公里", value
 
     # --------------------------
     # 核心工具方法
     # --------------------------
     @staticmethod
-    def _generic_distance_handler(poi_list, base_coord, config, field_config, poi_type="POI"):
-        """通用距离处理模板"""
+    def _generic_distance_handler(poi_list, base_coord, field, distances=None, poi_type="POI"):
+        """
+        通用距离处理模板
+        :return: (文本, 按字段单位取整后的距离)，等级由 _apply_levels 整列追加
+        """
         if not poi_list:
             return f"无{poi_type}"
 
         poi = DataProcessor._get_nearest_poi(poi_list)
-        actual_dist = DataProcessor._calculate_distance(base_coord, poi["location"])
+        actual_dist = DataProcessor._calculate_distance(base_coord, poi["location"], distances)
 
         # 单位转换
-        if "公里" in field_config["name"]:
-            converted = f"{DataProcessor._round_to_km(actual_dist)}公里"
-        else:
-            converted = f"{DataProcessor._round_to_meter(actual_dist)}米"
-
-        # 构建文本
-        text = f"距离{poi['name']}{converted}"
-
-        # 应用比较规则
-        rules = config["config"]["comparisons"].get(str(field_config["original_index"]), {})
-        level = DataProcessor._apply_comparison(converted, rules)
-        return f"{text}，{level}" if level else text
+        value = DataProcessor._round_distance(actual_dist, field.unit)
+        return f"距离{poi['name']}{value}{field.unit}", value
 
     @staticmethod
     def _get_nearest_poi(poi_list):
@@ -322,9 +463,18 @@ class DataProcessor:
         )
 
     @staticmethod
-    def _calculate_distance(coord1, location_dict):
-        """精确球面距离计算（米）"""
+    def _calculate_distance(coord1, location_dict, distances=None):
+        """
+        精确椭球距离计算（米）
+        :param distances: _precompute_distances 预先算好的距离表，命中时直接取值
+        """
         coord2 = (location_dict["lng"], location_dict["lat"])
+        if distances is not None:
+            cached = distances.get((coord1[0], coord1[1], coord2[0], coord2[1]))
+            if cached is not None:
+                return cached
+        # 延迟导入：只在实际逐点计算时加载geopy
+        from geopy.distance import geodesic
         return geodesic(
             (coord1[1], coord1[0]),  # (纬度, 经度)
             (coord2[1], coord2[0])
@@ -341,31 +491,52 @@ class DataProcessor:
         return int(round(meters / 100) * 100)
 
     @staticmethod
-    def _convert_distance(meters, unit_type):
-        """单位转换"""
+    def _round_distance(meters, unit_type):
+        """按单位取整（比较规则按取整后的数值判断）"""
         if unit_type == "公里":
-            return f"{DataProcessor._round_to_km(meters)}公里"
-        return f"{DataProcessor._round_to_meter(meters)}米"
-
-    @staticmethod
-    def _apply_comparison(converted_text, rules):
-        """应用比较规则（左闭右开区间）"""
-        # 提取数值和单位
-        match = re.match(r"(\d+\.?\d*)(公里|米)", converted_text)
-        if not match:
-            return ""
-
-        value = float(match.group(1))
-        unit = match.group(2)
-
-        for level, condition in rules.items():
-            min_val = condition.get("min")
-            max_val = condition.get("max")
-
-            # 边界判断
-            lower_ok = (min_val is None) or (value >= min_val)
-            upper_ok = (max_val is None) or (value < max_val)
-
-            if lower_ok and upper_ok:
-                return level
-        return ""
+            return DataProcessor._round_to_km(meters)
+        return DataProcessor._round_to_meter(meters)
+
+
+# 字段处理路由表（模块加载时构建一次）
+_FIELD_HANDLERS = {
+    # 距离类字段
+    "距轨道站点距离（米）": DataProcessor._handle_rail_distance,
+    "距最近商服中心的距离(公里)": DataProcessor._handle_commercial_center,
+    "距公交站点距离（米）": DataProcessor._handle_bus_station,
+    "公用设施条件(公里)": DataProcessor._handle_public_facility,
+    "距商务中心的距离(公里)": DataProcessor._handle_business_center,
+    "距火车站的距离(公里)": DataProcessor._handle_train_station,
+    "距最近货运火车站的距离(公里)": DataProcessor._handle_freight_train,
+    "距最近货运港口的距离(公里)": DataProcessor._handle_freight_port,
+    "距长途车站/客运站点距离(公里)": DataProcessor._handle_bus_terminal,
+    "距机场的距离(公里)": DataProcessor._handle_airport,
+    "距高速公路出入口的距离(公里)": DataProcessor._handle_highway_exit,
+
+    # 其他字段
+    "商服网点聚集程度": DataProcessor._handle_commercial_density,
+    "商务聚集程度": DataProcessor._handle_business_density,
+    "客流数量": DataProcessor._handle_passenger_flow,
+    "居住氛围": DataProcessor._handle_residential,
+    "道路通达程度": DataProcessor._handle_road_condition,
+    "临街（路）状况": DataProcessor._handle_street_condition,
+    "X米半径范围内公共交通线路数": DataProcessor._handle_public_transit,
+
+    # 基础字段
+    "位置": DataProcessor._handle_location,
+}
+
+# 返回数值、可应用比较规则的字段
+_NUMERIC_FIELDS = {
+    "距轨道站点距离（米）",
+    "距最近商服中心的距离(公里)",
+    "距公交站点距离（米）",
+    "公用设施条件(公里)",
+    "距商务中心的距离(公里)",
+    "距火车站的距离(公里)",
+    "距最近货运火车站的距离(公里)",
+    "距最近货运港口的距离(公里)",
+    "距长途车站/客运站点距离(公里)",
+    "距机场的距离(公里)",
+    "距高速公路出入口的距离(公里)",
+}
@@ -13,57 +13,207 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
+import os
+import tempfile
+from collections import OrderedDict
+
+from template_loader import load_template
+from metrics import NULL_METRICS
 
 
 class ExcelWriter:
     @staticmethod
-    def write(output_path, processed_data, template_path, config, progress_callback=None):
+    def write(output_path, processed_data, template, config, progress_callback=None, columns=None,
+              metrics=None):
+        """
+        :param template: 已加载的模板 DataFrame（见 template_loader.load_template），也可传入文件路径
+        :param columns: 输出行顺序（DataProcessor 处理计划的 columns，含评分列），
+                        不传时按配置中启用字段的顺序
+        :param progress_callback: 每写完一个分组Sheet调用 progress_callback(当前序号, 分组总数)
+        :param metrics: metrics.MetricsRegistry，记录写出耗时与Sheet数
+        """
+        # 延迟导入pandas/openpyxl，命令行模式启动时不加载
+        import pandas as pd
+        from openpyxl import Workbook
+
+        metrics = metrics or NULL_METRICS
         try:
-            template_df = pd.read_excel(template_path, dtype={'分组': str})
-            grouped = template_df.groupby('分组')
+            template_df = template if isinstance(template, pd.DataFrame) else load_template(template)
+            groups = ExcelWriter.index_groups(template_df)
 
-            # --- 1. 生成字段名映射表 ---
-            field_name_map = {}
+            field_name_map = ExcelWriter._field_name_map(config)
             enabled_items = [item for item in config["config"]["items"] if item["enabled"]]
-            for item in enabled_items:
-                original_name = item["name"]
-                if original_name == "X米半径范围内公共交通线路数":
-                    radius = item.get("radius", "X")
-                    new_name = f"{radius}米半径范围内公共交通线路数"
-                    field_name_map[original_name] = new_name
-
-            with pd.ExcelWriter(output_path, engine='openpyxl', mode='w') as writer:
-                if 'Sheet1' in writer.book.sheetnames:
-                    writer.book.remove(writer.book['Sheet1'])
-
-                # 遍历分组生成Sheet
-                for group_id, group_data in grouped:
-                    sheet_name = f"分组{group_id}"
-                    writer.book.create_sheet(title=sheet_name)
-                    worksheet = writer.book[sheet_name]
-
-                    # --- 2. 写入表头---
-                    headers = ["类目"] + list(group_data['类型'].unique())
-                    worksheet.append(headers)
-
-                    # --- 3. 写入数据行---
-                    ordered_fields = ["名称"] + [item["name"] for item in enabled_items]
-                    for field in ordered_fields:
-                        # 生成数据行第一列的值
-                        display_field = field_name_map.get(field, field)  
-                        row = [display_field]  
-
-                        # 填充数据
-                        for col in headers[1:]:
-                            community_name = group_data[group_data['类型'] == col]['小区'].values[0]
-                            value = processed_data.get(community_name, {}).get(field, "无数据")
-                            row.append(str(value))
-
-                        worksheet.append(row)
+            ordered_fields = columns or ["名称"] + [item["name"] for item in enabled_items]
+
+            # 只写模式：逐行写出，不在内存中保留整个工作簿
+            workbook = Workbook(write_only=True)
+            total = len(groups)
+            for idx, (group_id, members) in enumerate(groups.items(), 1):
+                with metrics.timer("excel_write"):
+                    ExcelWriter._write_group_sheet(
+                        workbook, group_id, members, ordered_fields, field_name_map, processed_data
+                    )
+                metrics.inc("sheets_written_total")
+                if progress_callback:
+                    progress_callback(idx, total)
+            with metrics.timer("excel_save"):
+                workbook.save(output_path)
 
             return True
         except Exception as e:
             raise RuntimeError(f"Excel生成失败: {str(e)}")
+
+    @staticmethod
+    def index_groups(template_df):
+        """
+        一次遍历模板建立 分组 → [(类型, 小区)] 索引
+        - 分组按分组编号排序，类型按在分组内首次出现的顺序
+        - 同一分组内重复的类型取第一个小区
+        """
+        import pandas as pd
+
+        groups = {}
+        for group_id, col, community in zip(template_df['分组'], template_df['类型'], template_df['小区']):
+            if pd.isna(group_id):
+                continue
+            members = groups.setdefault(group_id, OrderedDict())
+            members.setdefault(col, community)
+        return OrderedDict(
+            (group_id, list(groups[group_id].items())) for group_id in sorted(groups)
+        )
+
+    @staticmethod
+    def _field_name_map(config):
+        """生成字段名映射表（把半径填入字段名）"""
+        field_name_map = {}
+        for item in config["config"]["items"]:
+            if item["enabled"] and item["name"] == "X米半径范围内公共交通线路数":
+                radius = item.get("radius", "X")
+                field_name_map[item["name"]] = f"{radius}米半径范围内公共交通线路数"
+        return field_name_map
+
+    @staticmethod
+    def _write_group_sheet(workbook, group_id, members, ordered_fields, field_name_map, processed_data):
+        """写入一个分组的Sheet：首行为类型，之后每个字段一行"""
+        worksheet = workbook.create_sheet(title=f"分组{group_id}")
+
+        # 表头
+        worksheet.append(["类目"] + [col for col, _ in members])
+
+        # 数据行
+        rows = [processed_data.get(community, {}) for _, community in members]
+        for field in ordered_fields:
+            row = [field_name_map.get(field, field)]
+            for data in rows:
+                value = data.get(field, "无数据")
+                row.append(value if isinstance(value, (int, float)) else str(value))
+            worksheet.append(row)
+
+
+class ExcelStreamWriter:
+    """
+    流式写出：逐个地址接收加工结果，一个分组的所有小区到齐后立即写出该分组的Sheet，
+    并释放不再被后续分组引用的结果。分组按编号顺序写出，先完成的后序分组暂存等待。
+    """
+
+    def __init__(self, output_path, groups, config, columns, progress_callback=None, metrics=None):
+        """
+        :param groups: ExcelWriter.index_groups 生成的分组索引
+        :param columns: 输出行顺序（DataProcessor 处理计划的 columns）
+        :param metrics: metrics.MetricsRegistry，记录写出耗时与Sheet数
+        """
+        from openpyxl import Workbook
+
+        self.output_path = output_path
+        self.columns = columns
+        self.field_name_map = ExcelWriter._field_name_map(config)
+        self.progress_callback = progress_callback
+        self.metrics = metrics or NULL_METRICS
+        self.workbook = Workbook(write_only=True)
+        self._saved = False
+
+        self._groups = list(groups.items())
+        self._next = 0
+        self._rows = {}
+        # 每个分组尚未到齐的小区，以及每个小区被多少个未写出的分组引用
+        self._outstanding = []
+        self._refcount = {}
+        for _, members in self._groups:
+            communities = {community for _, community in members}
+            self._outstanding.append(communities)
+            for community in communities:
+                self._refcount[community] = self._refcount.get(community, 0) + 1
+
+    def add(self, community, row):
+        """
+        接收一个小区的加工结果
+        :param row: DataProcessor 输出的一行；获取失败时传 None（该小区输出"无数据"）
+        """
+        if community not in self._refcount:
+            return
+        self._rows[community] = row or {}
+        self._flush()
+
+    def close(self):
+        """
+        写出剩余分组（缺失的小区按"无数据"输出）并保存文件：
+        先保存到同目录的临时文件，成功后替换输出文件，失败时删除临时文件
+        """
+        self._flush(force=True)
+        self._saved = True
+        temp_path = self._temp_path()
+        try:
+            with self.metrics.timer("excel_save"):
+                self.workbook.save(temp_path)
+            os.replace(temp_path, self.output_path)
+        except BaseException:
+            self._remove(temp_path)
+            raise
+
+    def discard(self):
+        """
+        放弃写出（取消或出错时），输出文件保持原样。
+        已写的Sheet暂存在openpyxl的临时文件中，保存到临时文件后删除以释放它们
+        """
+        if self._saved:
+            return
+        self._saved = True
+        temp_path = self._temp_path()
+        try:
+            self.workbook.save(temp_path)
+        except Exception:
+            pass
+        finally:
+            self._remove(temp_path)
+
+    def _temp_path(self):
+        directory, name = os.path.split(os.path.abspath(self.output_path))
+        fd, path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+        os.close(fd)
+        return path
+
+    @staticmethod
+    def _remove(path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _flush(self, force=False):
+        while self._next < len(self._groups):
+            group_id, members = self._groups[self._next]
+            outstanding = self._outstanding[self._next]
+            outstanding.difference_update(self._rows.keys() & outstanding)
+            if outstanding and not force:
+                return
+
+            with self.metrics.timer("excel_write"):
+                ExcelWriter._write_group_sheet(
+                    self.workbook, group_id, members, self.columns, self.field_name_map, self._rows
+                )
+            self.metrics.inc("sheets_written_total")
+            for community in {community for _, community in members}:
+                self._refcount[community] -= 1
+                if self._refcount[community] == 0:
+                    self._rows.pop(community, None)
+            self._next += 1
+            if self.progress_callback:
+                self.progress_callback(self._next, len(self._groups))
@@ -0,0 +1,87 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+批量距离计算（NumPy向量化）
+
+可选算法：
+- "lambert"：WGS84椭球上的Lambert公式（球面距离 + 扁率一阶修正）。
+  与 geopy.distance.geodesic 相比相对误差小于 2e-6（1公里误差约2毫米），
+  远小于报告中的取整精度（米字段按100米、公里字段按0.1公里）。
+- "haversine"：平均半径球面公式，相对误差最大约 0.5%，仅用于对精度不敏感的场景。
+"""
+
+import numpy as np
+
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+MEAN_EARTH_RADIUS = 6371008.8
+
+# 可选算法（"geodesic" 由 DataProcessor 逐点调用 geopy 计算）
+BACKENDS = ("geodesic", "lambert", "haversine")
+
+
+def _central_angle(lat1, lng1, lat2, lng2):
+    """球面中心角（弧度），输入为弧度"""
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    h = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def haversine(lng1, lat1, lng2, lat2):
+    """球面距离（米），参数为经纬度（度）数组"""
+    lng1, lat1, lng2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lng1, lat1, lng2, lat2))
+    return MEAN_EARTH_RADIUS * _central_angle(lat1, lng1, lat2, lng2)
+
+
+def lambert(lng1, lat1, lng2, lat2):
+    """WGS84椭球距离（米，Lambert公式），参数为经纬度（度）数组"""
+    lng1, lat1, lng2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lng1, lat1, lng2, lat2))
+
+    # 归化纬度
+    beta1 = np.arctan((1 - WGS84_F) * np.tan(lat1))
+    beta2 = np.arctan((1 - WGS84_F) * np.tan(lat2))
+    sigma = _central_angle(beta1, lng1, beta2, lng2)
+
+    p = (beta1 + beta2) / 2
+    q = (beta2 - beta1) / 2
+    half_sin2 = np.sin(sigma / 2) ** 2
+    half_cos2 = np.cos(sigma / 2) ** 2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = (sigma - np.sin(sigma)) * np.sin(p) ** 2 * np.cos(q) ** 2 / half_cos2
+        y = (sigma + np.sin(sigma)) * np.cos(p) ** 2 * np.sin(q) ** 2 / half_sin2
+        distance = WGS84_A * (sigma - WGS84_F / 2 * (x + y))
+
+    # 重合点
+    return np.where(sigma > 0, distance, 0.0)
+
+
+def pairwise(base_coords, poi_coords, backend="lambert"):
+    """
+    逐对计算距离
+    :param base_coords: [(lng, lat), ...]
+    :param poi_coords: [(lng, lat), ...]，与 base_coords 一一对应
+    :return: 距离数组（米）
+    """
+    if backend not in ("lambert", "haversine"):
+        raise ValueError(f"不支持的向量化距离算法: {backend}")
+    if not base_coords:
+        return np.zeros(0)
+    base = np.asarray(base_coords, dtype=float)
+    poi = np.asarray(poi_coords, dtype=float)
+    func = lambert if backend == "lambert" else haversine
+    return func(base[:, 0], base[:, 1], poi[:, 0], poi[:, 1])
@@ -0,0 +1,67 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+
+# 每度纬度对应的米数（近似）
+METERS_PER_DEGREE = 111320.0
+# 网格按行中心纬度计算经度步长，行内纬度变化带来的误差很小，半径外扩时额外留出1%余量
+SAFETY_FACTOR = 1.01
+
+
+class GridSnapper:
+    """
+    检索中心网格吸附：把坐标吸附到边长为 cell_size 米的网格中心，
+    同一网格内的地址共用一次POI检索（检索半径外扩最大吸附误差，保证覆盖原半径），
+    距离再由 DataProcessor 按各地址的真实坐标重新计算
+    """
+
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise ValueError("网格边长必须大于0")
+        self.cell_size = float(cell_size)
+        # 最大吸附误差：网格半对角线
+        self.max_error = self.cell_size * math.sqrt(2) / 2
+        # 检索半径外扩量（米）
+        self.margin = math.ceil(self.max_error * SAFETY_FACTOR)
+
+    @classmethod
+    def from_config(cls, options):
+        """
+        :param options: 配置中的 grid_snap，如 {"enabled": true, "cell_size": 100}；
+                        也可用 {"enabled": true, "max_error": 50} 按允许的最大吸附误差（米）反推网格边长
+        :return: GridSnapper；未启用时返回 None
+        """
+        options = options or {}
+        if not options.get("enabled", False):
+            return None
+        if options.get("max_error"):
+            return cls(float(options["max_error"]) * math.sqrt(2))
+        return cls(options.get("cell_size", 100))
+
+    def snap(self, coord):
+        """
+        :param coord: (lng, lat)
+        :return: 所在网格中心 (lng, lat)
+        """
+        lng, lat = float(coord[0]), float(coord[1])
+        lat_step = self.cell_size / METERS_PER_DEGREE
+        row = math.floor(lat / lat_step)
+        center_lat = (row + 0.5) * lat_step
+        # 经度步长按行中心纬度计算，使网格在各纬度上都约为 cell_size 米见方
+        lng_step = self.cell_size / (METERS_PER_DEGREE * math.cos(math.radians(center_lat)))
+        col = math.floor(lng / lng_step)
+        center_lng = (col + 0.5) * lng_step
+        return (round(center_lng, 6), round(center_lat, 6))
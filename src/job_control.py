@@ -0,0 +1,76 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+# 暂停或等待在途请求时检查控制状态的间隔（秒）
+POLL_INTERVAL = 0.2
+
+
+class JobCancelled(Exception):
+    """任务被取消（已获取的数据保留在断点日志中）"""
+
+
+class JobControl:
+    """
+    任务控制：暂停、继续、取消（协作式）
+    - 暂停：不再派发新的地址，在途地址完成后停下等待继续
+    - 取消：不再派发新的地址，在途地址的请求不再重试（当前请求返回后即中止，受请求超时限制），
+      已完成的地址写入断点日志后终止
+    可以从任意线程调用（如GUI按钮、信号处理函数）
+    """
+
+    def __init__(self, metrics=None):
+        """
+        :param metrics: 该任务自己的指标注册表（metrics.MetricsRegistry）；多个任务共用客户端时，
+                        客户端把请求数与缓存命中同时计入这里，进度中的速率与命中率只反映本任务
+        """
+        self.metrics = metrics
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # 唤醒暂停中的等待
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set() and not self._cancelled.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def wait_while_paused(self, timeout=POLL_INTERVAL):
+        """暂停时最多等待 timeout 秒，返回是否仍处于暂停"""
+        self._running.wait(timeout)
+        return self.paused
+
+    def sleep(self, seconds):
+        """等待 seconds 秒，期间被取消时立即返回（用于请求重试前的退避）"""
+        self._cancelled.wait(seconds)
+
+    def check(self):
+        """已取消时抛出 JobCancelled"""
+        if self.cancelled:
+            raise JobCancelled("任务已取消")
@@ -0,0 +1,465 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+任务服务：常驻运行，通过本地HTTP接口或监视目录接收任务（模板 + 导出的配置JSON），
+所有任务共用同一个 BaiduMapClient（缓存、连接池、AK池与自适应并发）和同一个地址线程池。
+多个任务中重复的地址只请求一次：同时在途的相同请求由客户端合并，先后出现的由缓存命中。
+
+AK、缓存、分页、地址归一化、网格吸附、离线索引、并发数、接口地址、断点日志等设置只取自服务配置；
+任务配置中只有 JOB_OPTIONS（启用字段与半径、比较规则、显示顺序、距离算法、流式输出）生效，其余忽略。
+指标由 GET /metrics 提供，任务不会按配置导出指标文件。
+
+HTTP接口（JSON）：
+- POST /jobs                     提交任务：{"template": 工作目录或监视目录内的模板路径} 或
+                                 {"filename": "模板.xlsx", "data": base64内容}，可选 "config"、"name"
+- GET  /jobs                     任务列表
+- GET  /jobs/<id>                任务状态与进度
+- GET  /jobs/<id>/result         下载结果Excel（任务完成后）
+- POST /jobs/<id>/pause|resume|cancel
+- GET  /jobs/<id>/metrics        该任务的指标（Prometheus文本格式）
+- GET  /metrics                  全部任务共用客户端的指标（Prometheus文本格式）
+
+监视目录：放入模板文件（可附带同名 .json 配置）即提交任务，
+处理中的文件移到 processing/，结果写入 output/，完成后模板移到 done/，失败移到 failed/ 并附错误说明。
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, quote
+
+from cache_store import DEFAULT_DATA_DIR
+from template_loader import SUPPORTED_EXTENSIONS
+from metrics import MetricsRegistry
+from job_control import JobControl, JobCancelled
+from pipeline import Pipeline, build_client
+
+DEFAULT_PORT = 8600
+DEFAULT_MAX_JOBS = 2
+DEFAULT_WORK_DIR = os.path.join(DEFAULT_DATA_DIR, "jobs")
+# 监视目录的扫描间隔，以及文件最后修改后等待多久才视为写入完成（秒）
+WATCH_INTERVAL = 2.0
+SETTLE_SECONDS = 2.0
+
+# 任务配置中可覆盖服务配置的项（只影响加工与输出）
+JOB_OPTIONS = ("items", "comparisons", "display_order", "distance_backend", "streaming")
+
+QUEUED, RUNNING, PAUSED, DONE, FAILED, CANCELLED = "queued", "running", "paused", "done", "failed", "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    """一个任务的状态（由 JobServer 更新，HTTP 接口只读）"""
+
+    def __init__(self, job_id, name, template_path, config, output_file):
+        self.id = job_id
+        self.name = name
+        self.template_path = template_path
+        self.config = config
+        self.output_file = output_file
+        # 本任务的指标：请求数与缓存命中由共用客户端同时计入，进度中的速率与命中率只反映本任务
+        self.metrics = MetricsRegistry()
+        self.control = JobControl(metrics=self.metrics)
+        self.state = QUEUED
+        self.error = None
+        self.progress = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def status(self):
+        if self.state == RUNNING and self.control.paused:
+            return PAUSED
+        return self.state
+
+    def on_progress(self, event):
+        self.progress = event
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "error": self.error,
+            "output": self.output_file if self.state == DONE else None,
+            "progress": self.progress._asdict() if self.progress else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobServer:
+    def __init__(self, config, work_dir=None, max_jobs=DEFAULT_MAX_JOBS, watch_dir=None,
+                 host="127.0.0.1", port=DEFAULT_PORT):
+        """
+        :param config: 服务配置（"导出配置"生成的JSON），提供AK等客户端设置及任务的默认配置
+        :param work_dir: 上传的模板与结果存放目录
+        :param max_jobs: 同时运行的任务数；各任务的地址共用一个线程池，并发总数仍为 max_workers
+        :param watch_dir: 监视目录，不传时只接受HTTP提交
+        :param port: 0 表示自动选择空闲端口
+        """
+        self.config = config
+        self.work_dir = work_dir or DEFAULT_WORK_DIR
+        self.watch_dir = watch_dir
+        self.metrics = MetricsRegistry()
+        self.client = build_client(config, metrics=self.metrics)
+        self._address_pool = ThreadPoolExecutor(
+            max_workers=self.client.max_workers, thread_name_prefix="baidu-address"
+        )
+        self._job_pool = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="baidu-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        self._start_thread(self._httpd.serve_forever, "job-server-http")
+        if self.watch_dir:
+            for sub in ("processing", "output", "done", "failed"):
+                os.makedirs(os.path.join(self.watch_dir, sub), exist_ok=True)
+            self._recover_watched()
+            self._start_thread(self._watch, "job-server-watch")
+        return self
+
+    def stop(self):
+        """停止接收任务，取消进行中的任务（已获取的地址保留在断点日志中）并释放客户端"""
+        self._stopped.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        for job in self.jobs():
+            if job.state not in FINISHED_STATES:
+                job.control.cancel()
+        for thread in self._threads:
+            thread.join()
+        self._job_pool.shutdown(wait=True)
+        self._address_pool.shutdown(wait=True)
+        self.client.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    # --------------------------
+    # 任务管理
+    # --------------------------
+    def submit(self, template_path, config=None, name=None, output_file=None, on_finish=None,
+               journal_dir=None):
+        """
+        提交任务
+        :param config: 任务配置（导出的配置JSON），不传时使用服务配置
+        :param output_file: 结果文件，默认写入工作目录下该任务的子目录
+        :param on_finish: 任务结束（完成、失败或取消）后调用 on_finish(job)
+        :param journal_dir: 断点日志目录，默认为该任务的子目录
+        :return: Job
+        """
+        config = self._job_config(config)
+        if os.path.splitext(template_path)[1].lower() not in SUPPORTED_EXTENSIONS:
+            raise ValueError(f"不支持的文件格式，支持 {'、'.join(SUPPORTED_EXTENSIONS)}")
+        if not os.path.exists(template_path):
+            raise ValueError(f"模板文件不存在: {template_path}")
+
+        job_id = uuid.uuid4().hex[:12]
+        name = name or os.path.basename(template_path)
+        # 每个任务使用自己的断点日志：相同模板同时运行时不会共用（并提前删除）同一个日志文件
+        journal_dir = journal_dir or os.path.join(self._job_dir(job_id), "journal")
+        options = config["config"]
+        config = dict(config, config=dict(options, journal=dict(options.get("journal") or {}, dir=journal_dir)))
+        if output_file is None:
+            stem = os.path.splitext(os.path.basename(template_path))[0]
+            output_file = os.path.join(self._job_dir(job_id), f"{stem}_结果.xlsx")
+        job = Job(job_id, name, template_path, config, output_file)
+        with self._lock:
+            self._jobs[job_id] = job
+        self._job_pool.submit(self._run, job, on_finish)
+        return job
+
+    def submit_upload(self, filename, data, config=None, name=None):
+        """提交上传的模板内容（保存到工作目录后提交）"""
+        filename = os.path.basename(filename or "")
+        if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+            raise ValueError(f"不支持的文件格式，支持 {'、'.join(SUPPORTED_EXTENSIONS)}")
+        upload_dir = os.path.join(self.work_dir, "uploads", uuid.uuid4().hex[:12])
+        os.makedirs(upload_dir, exist_ok=True)
+        path = os.path.join(upload_dir, filename)
+        with open(path, "wb") as f:
+            f.write(data)
+        return self.submit(path, config, name=name or filename)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _job_dir(self, job_id):
+        path = os.path.join(self.work_dir, job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _job_config(self, config):
+        """以服务配置为基础，只合并任务配置中的 JOB_OPTIONS；不导出指标文件（由 /metrics 提供）"""
+        options = dict(self.config["config"])
+        if config is not None:
+            if not isinstance(config, dict) or not isinstance(config.get("config"), dict) \
+                    or "items" not in config["config"]:
+                raise ValueError("无效的配置文件格式")
+            options.update((key, config["config"][key]) for key in JOB_OPTIONS if key in config["config"])
+        options.pop("metrics", None)
+        return dict(self.config, config=options)
+
+    def _run(self, job, on_finish):
+        if job.control.cancelled:
+            job.state = CANCELLED
+        else:
+            job.state = RUNNING
+            job.started_at = time.time()
+            pipeline = Pipeline(
+                job.config, job.template_path, job.output_file,
+                client=self.client,
+                executor=self._address_pool,
+                metrics=job.metrics,
+                control=job.control,
+                progress_event_callback=job.on_progress
+            )
+            try:
+                pipeline.run()
+                job.state = DONE
+            except JobCancelled:
+                job.state = CANCELLED
+            except Exception as e:
+                job.error = str(e)
+                job.state = FAILED
+        job.finished_at = time.time()
+        if on_finish:
+            try:
+                on_finish(job)
+            except Exception as e:
+                print(f"任务{job.id}收尾失败: {str(e)}", file=sys.stderr)
+
+    # --------------------------
+    # 监视目录
+    # --------------------------
+    def _watch(self):
+        while not self._stopped.wait(WATCH_INTERVAL):
+            try:
+                self._scan_watched()
+            except OSError as e:
+                print(f"扫描监视目录失败: {str(e)}", file=sys.stderr)
+
+    def _scan_watched(self):
+        now = time.time()
+        for entry in sorted(os.scandir(self.watch_dir), key=lambda e: e.name):
+            stem, ext = os.path.splitext(entry.name)
+            # 跳过子目录、Excel的临时锁文件，以及仍在写入的文件
+            if not entry.is_file() or ext.lower() not in SUPPORTED_EXTENSIONS or entry.name.startswith(("~$", ".")):
+                continue
+            if now - entry.stat().st_mtime < SETTLE_SECONDS:
+                continue
+            processing = os.path.join(self.watch_dir, "processing")
+            sidecar = os.path.join(self.watch_dir, f"{stem}.json")
+            if os.path.exists(sidecar):
+                os.replace(sidecar, os.path.join(processing, f"{stem}.json"))
+            os.replace(entry.path, os.path.join(processing, entry.name))
+            self._submit_watched(entry.name)
+
+    def _recover_watched(self):
+        """服务重启后重新提交上次未处理完的文件（断点日志仍在，已获取的地址不再请求）"""
+        processing = os.path.join(self.watch_dir, "processing")
+        for filename in sorted(os.listdir(processing)):
+            if os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS:
+                self._submit_watched(filename)
+
+    def _submit_watched(self, filename):
+        stem = os.path.splitext(filename)[0]
+        processing = os.path.join(self.watch_dir, "processing")
+        template_path = os.path.join(processing, filename)
+        sidecar = os.path.join(processing, f"{stem}.json")
+        output_file = os.path.join(self.watch_dir, "output", f"{stem}_结果.xlsx")
+        try:
+            config = None
+            if os.path.exists(sidecar):
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            # 断点日志按文件名存放，服务重启后重新提交时可以接着上次的进度
+            self.submit(
+                template_path, config, output_file=output_file, on_finish=self._finish_watched,
+                journal_dir=os.path.join(processing, ".journals", stem)
+            )
+        except Exception as e:
+            self._move_watched(template_path, sidecar, "failed", str(e))
+
+    def _finish_watched(self, job):
+        stem = os.path.splitext(os.path.basename(job.template_path))[0]
+        sidecar = os.path.join(os.path.dirname(job.template_path), f"{stem}.json")
+        if job.state == DONE:
+            self._move_watched(job.template_path, sidecar, "done")
+        elif job.state == FAILED:
+            self._move_watched(job.template_path, sidecar, "failed", job.error)
+        # 取消（服务停止）的任务留在 processing/，下次启动时继续
+
+    def _move_watched(self, template_path, sidecar, target, error=None):
+        target_dir = os.path.join(self.watch_dir, target)
+        for path in (template_path, sidecar):
+            if os.path.exists(path):
+                os.replace(path, os.path.join(target_dir, os.path.basename(path)))
+        if error:
+            stem = os.path.splitext(os.path.basename(template_path))[0]
+            with open(os.path.join(target_dir, f"{stem}.error.txt"), "w", encoding="utf-8") as f:
+                f.write(error)
+
+    # --------------------------
+    # HTTP接口
+    # --------------------------
+    def handle(self, method, path, body=None):
+        """
+        :return: (HTTP状态码, 响应体)；响应体为 dict（JSON）、str（文本）或 (文件路径, 下载文件名)
+        """
+        parts = [part for part in path.split("/") if part]
+        if parts == ["metrics"] and method == "GET":
+            return 200, self.metrics.to_prometheus()
+        if not parts or parts[0] != "jobs" or len(parts) > 3:
+            return 404, {"error": "接口不存在"}
+
+        if len(parts) == 1:
+            if method == "GET":
+                return 200, {"jobs": [job.to_dict() for job in self.jobs()]}
+            if method == "POST":
+                return self._handle_submit(body)
+            return 405, {"error": "不支持的请求方法"}
+
+        job = self.get(parts[1])
+        if job is None:
+            return 404, {"error": "任务不存在"}
+        action = parts[2] if len(parts) == 3 else None
+        if action is None and method == "GET":
+            return 200, job.to_dict()
+        if action == "metrics" and method == "GET":
+            return 200, job.metrics.to_prometheus()
+        if action == "result" and method == "GET":
+            if job.state != DONE:
+                return 409, {"error": f"任务尚未完成（{job.status}）"}
+            return 200, (job.output_file, os.path.basename(job.output_file))
+        if action in ("pause", "resume", "cancel") and method == "POST":
+            if job.state in FINISHED_STATES:
+                return 409, {"error": f"任务已结束（{job.status}）"}
+            getattr(job.control, action)()
+            return 200, job.to_dict()
+        return 404, {"error": "接口不存在"}
+
+    def _handle_submit(self, body):
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                return 400, {"error": "请求体应为JSON对象"}
+            if request.get("data") is not None:
+                job = self.submit_upload(
+                    request.get("filename"), base64.b64decode(request["data"]),
+                    request.get("config"), name=request.get("name")
+                )
+            elif request.get("template"):
+                if not self._servable_path(request["template"]):
+                    return 403, {"error": "模板须位于服务的工作目录或监视目录内，其他位置的文件请上传"}
+                job = self.submit(request["template"], request.get("config"), name=request.get("name"))
+            else:
+                return 400, {"error": "缺少模板：请提供 template（路径）或 filename 与 data（base64）"}
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        return 202, job.to_dict()
+
+    def _servable_path(self, path):
+        """HTTP 提交的模板路径是否位于工作目录或监视目录内（防止读取服务器上的任意文件）"""
+        path = os.path.realpath(path)
+        for root in (self.work_dir, self.watch_dir):
+            if root:
+                root = os.path.realpath(root)
+                if os.path.commonpath([path, root]) == root:
+                    return True
+        return False
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    self.close_connection = True
+                    self._respond(400, {"error": "Content-Length 无效"})
+                    return
+                self._dispatch("POST", self.rfile.read(length) if length else None)
+
+            def _dispatch(self, method, body=None):
+                self._respond(*server.handle(method, urlparse(self.path).path, body))
+
+            def _respond(self, code, payload):
+                if isinstance(payload, tuple):
+                    path, filename = payload
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                elif isinstance(payload, str):
+                    data = payload.encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json; charset=utf-8"
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                if isinstance(payload, tuple):
+                    self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(filename)}")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,113 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import hashlib
+import threading
+
+from cache_store import DEFAULT_DATA_DIR
+from api_client import API_BASE_URL
+
+DEFAULT_JOURNAL_DIR = os.path.join(DEFAULT_DATA_DIR, "journals")
+
+
+def job_fingerprint(addresses, config):
+    """
+    任务指纹：由地址列表与影响原始数据的配置决定（启用字段、半径、分页、网格吸附、
+    地址规范化、离线POI索引与接口地址），AK、显示顺序、比较规则等只影响加工环节，不参与计算
+    """
+    options = config["config"]
+    fetch_items = sorted(
+        (item["name"], item.get("radius")) for item in options["items"] if item["enabled"]
+    )
+    payload = {
+        "addresses": [str(address) for address in addresses],
+        "items": fetch_items,
+        "pagination": options.get("pagination", {}),
+        "grid_snap": options.get("grid_snap", {}),
+        "address_normalization": options.get("address_normalization", {}),
+        "poi_index": options.get("poi_index", {}).get("path"),
+        "base_url": options.get("base_url", API_BASE_URL).rstrip("/"),
+    }
+    data = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+class FetchJournal:
+    """
+    获取阶段的断点日志（JSON Lines）
+    每完成一个地址追加一行 {"address": ..., "raw": ...} 并刷盘，
+    同一模板与配置再次运行时读取已完成的地址，只获取剩余部分
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_job(cls, addresses, config, directory=None):
+        directory = directory or DEFAULT_JOURNAL_DIR
+        os.makedirs(directory, exist_ok=True)
+        return cls(os.path.join(directory, f"{job_fingerprint(addresses, config)}.jsonl"))
+
+    def load(self):
+        """读取已完成的地址 {地址: 原始数据}"""
+        return dict(self.entries())
+
+    def entries(self):
+        """逐条读取 (地址, 原始数据)；进程中途退出导致的不完整末行会被忽略"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield entry["address"], entry["raw"]
+
+    def append(self, address, raw):
+        line = json.dumps({"address": address, "raw": raw}, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                broken_tail = self._has_broken_tail()
+                self._file = open(self.path, "a", encoding="utf-8")
+                # 上次中断时末行可能不完整，另起一行避免与新记录拼接
+                if broken_tail:
+                    self._file.write("\n")
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _has_broken_tail(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return False
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        """任务成功完成后删除断点日志"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -13,14 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from api_client import BaiduMapClient
+from api_client import DEFAULT_MAX_WORKERS
+from cache_store import open_cache
 from data_processor import DataProcessor
-from excel_report_writer import ExcelWriter
+from rule_engine import RuleError
+from pipeline import Pipeline
+from progress import STAGE_NAMES, format_event
+from job_control import JobControl, JobCancelled
 import sys
 import json
 import base64
 import webbrowser
-import pandas as pd
 import requests
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -79,8 +82,12 @@ COMPARE_LEVELS = ['优', '较优', '一般', '较差', '差']
 
 class WorkerSignals(QObject):
     progress = Signal(int, str)
+    # 结构化进度（progress.ProgressEvent）：当前环节、完成数、速率、缓存命中率与预计剩余时间
+    progress_event = Signal(object)
     finished = Signal(bool)
     error = Signal(str)
+    # 任务被取消（已获取的数据保留在断点日志中）
+    cancelled = Signal()
 
 
 class WorkerThread(QThread):
@@ -90,59 +97,34 @@ class WorkerThread(QThread):
         self.template_path = template_path
         self.output_file = output_file
         self.signals = WorkerSignals()
+        # 暂停/继续/取消
+        self.control = JobControl()
         self.raw_data = {}
         self.total_groups = 0  
 
     def run(self):
         try:
-            client = BaiduMapClient(self.config["config"]["ak"])
-            template_df = pd.read_excel(self.template_path)
-            addresses = template_df['小区'].unique()
-            total_addresses = len(addresses)
-
-            for idx, address in enumerate(addresses, 1):
-                raw = client.get_location_data(address, self.config["config"]["items"])
-                if raw:
-                    self.raw_data[address] = raw
-                # 实时进度计算
-                progress = int(idx / total_addresses * 70)
-                self.signals.progress.emit(
-                    progress,
-                    f"获取数据({idx}/{total_addresses}): {address[:10]}..."
-                )
-
-            self.signals.progress.emit(70, "数据加工中...")
-            processed_data = DataProcessor.process(self.raw_data, self.config)
-
-            template_df = pd.read_excel(self.template_path)
-            self.total_groups = len(template_df.groupby('分组'))
-            self.signals.progress.emit(90, f"准备生成{self.total_groups}个分组")
-
-            self.signals.progress.emit(90, "开始生成Excel文件...")
-            ExcelWriter.write(
-                self.output_file,
-                processed_data,
-                self.template_path,
+            pipeline = Pipeline(
                 self.config,
-                progress_callback=self._update_excel_progress  # 绑定回调
+                self.template_path,
+                self.output_file,
+                progress_callback=self.signals.progress.emit,
+                progress_event_callback=self.signals.progress_event.emit,
+                control=self.control
             )
-
-            self.signals.progress.emit(100, "处理完成")
+            # 与流程共享原始数据，便于出错后查看已获取的部分
+            self.raw_data = pipeline.raw_data
+            pipeline.run()
+            self.total_groups = pipeline.total_groups
             self.signals.finished.emit(True)
 
+        except JobCancelled:
+            self.signals.cancelled.emit()
         except Exception as e:
             self.signals.error.emit(f"处理失败: {str(e)}")
             import traceback
             traceback.print_exc()
 
-    def _update_excel_progress(self, current, total):
-        """Excel生成进度回调"""
-        percent = 90 + int(current / total * 10)
-        self.signals.progress.emit(
-            percent,
-            f"正在生成分组{current}/{total}"
-        )
-
 
 class CompareRuleWidget(QWidget):
     def __init__(self, original_index, parent=None):
@@ -226,6 +208,7 @@ class MainWindow(QMainWindow):
             "original_order": [defn[0] for defn in FIELD_DEFINITIONS],
             "config": {
                 "ak": "",
+                "max_workers": DEFAULT_MAX_WORKERS,
                 "display_order": [defn[0] for defn in FIELD_DEFINITIONS],
                 "items": [],
                 "comparisons": {}
@@ -279,6 +262,10 @@ class MainWindow(QMainWindow):
         self.btn_export.clicked.connect(self.export_config)
         self.btn_import = QPushButton("导入配置")
         self.btn_import.clicked.connect(self.import_config)
+        self.btn_import_cache = QPushButton("导入缓存")
+        self.btn_import_cache.clicked.connect(self.import_cache)
+        self.btn_export_cache = QPushButton("导出缓存")
+        self.btn_export_cache.clicked.connect(self.export_cache)
         self.btn_update = QPushButton("检查更新")
         self.btn_update.clicked.connect(self.check_for_updates)
         self.btn_help = QPushButton("使用说明")
@@ -286,6 +273,8 @@ class MainWindow(QMainWindow):
         right_tool.addWidget(self.btn_save)
         right_tool.addWidget(self.btn_export)
         right_tool.addWidget(self.btn_import)
+        right_tool.addWidget(self.btn_import_cache)
+        right_tool.addWidget(self.btn_export_cache)
         right_tool.addWidget(self.btn_update)
         right_tool.addWidget(self.btn_help)
         top_bar.addLayout(right_tool)
@@ -331,12 +320,24 @@ class MainWindow(QMainWindow):
         # 底部按钮
         self.btn_process = QPushButton("开始处理")
         self.btn_process.clicked.connect(self.start_processing)
+        self.btn_pause = QPushButton("暂停")
+        self.btn_pause.clicked.connect(self.toggle_pause)
+        self.btn_cancel = QPushButton("取消")
+        self.btn_cancel.clicked.connect(self.cancel_processing)
+        self.set_running(False)
+        # 处理中的详细进度：环节、速率、缓存命中率、剩余时间
+        self.progress_label = QLabel("")
 
         # 主布局
         main_layout = QVBoxLayout()
         main_layout.addLayout(top_bar)
         main_layout.addLayout(main_content)
-        main_layout.addWidget(self.btn_process)
+        process_bar = QHBoxLayout()
+        process_bar.addWidget(self.btn_process, 1)
+        process_bar.addWidget(self.btn_pause)
+        process_bar.addWidget(self.btn_cancel)
+        main_layout.addLayout(process_bar)
+        main_layout.addWidget(self.progress_label)
 
         container = QWidget()
         container.setLayout(main_layout)
@@ -615,6 +616,34 @@ class MainWindow(QMainWindow):
                 error_msg = f"导入失败: {str(e)}\n追踪信息:\n{traceback.format_exc()}"
                 QMessageBox.critical(self, "系统错误", error_msg)
 
+    def export_cache(self):
+        """导出本地API缓存，供他人导入复用"""
+        path, _ = QFileDialog.getSaveFileName(self, "导出缓存文件", "", "缓存文件 (*.sqlite3)")
+        if path:
+            try:
+                cache = open_cache(dict(self.temp_config["config"].get("cache", {}), enabled=True))
+                try:
+                    cache.export_to(path)
+                finally:
+                    cache.close()
+                QMessageBox.information(self, "成功", "缓存导出成功")
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"导出缓存失败: {str(e)}")
+
+    def import_cache(self):
+        """合并他人导出的缓存文件到本地缓存"""
+        path, _ = QFileDialog.getOpenFileName(self, "选择缓存文件", "", "缓存文件 (*.sqlite3)")
+        if path:
+            try:
+                cache = open_cache(dict(self.temp_config["config"].get("cache", {}), enabled=True))
+                try:
+                    imported = cache.import_from(path)
+                finally:
+                    cache.close()
+                QMessageBox.information(self, "成功", f"缓存导入完成，共合并{imported}条记录")
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"导入缓存失败: {str(e)}")
+
     def rebuild_interface(self):
         self.field_list.clear()
         for original_index in self.temp_config["config"]["display_order"]:
@@ -649,7 +678,9 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "错误", f"生成模板失败: {str(e)}")
 
     def upload_file(self):
-        self.input_file, _ = QFileDialog.getOpenFileName(self, "选择Excel文件", "", "Excel文件 (*.xlsx *.xls)")
+        self.input_file, _ = QFileDialog.getOpenFileName(
+            self, "选择数据文件", "", "数据文件 (*.xlsx *.xls *.csv *.parquet)"
+        )
         if self.input_file:
             QMessageBox.information(self, "成功", f"已选择文件: {self.input_file}")
 
@@ -665,13 +696,18 @@ class MainWindow(QMainWindow):
                         f"字段【{item['name']}】需要填写半径参数！"
                     )
                     return False
+        try:
+            DataProcessor.compile(self.temp_config)
+        except RuleError as e:
+            QMessageBox.critical(self, "比较规则错误", str(e))
+            return False
         return True
 
     def start_processing(self):
         self.save_temp_config()
         if not self.validate_config():  
             return
-        if not self.temp_config["config"]["ak"]:
+        if not self.temp_config["config"]["ak"] and not self.temp_config["config"].get("ak_pool"):
             QMessageBox.critical(self, "错误", "请先输入百度地图AK")
             return
         if not self.input_file:
@@ -680,18 +716,48 @@ class MainWindow(QMainWindow):
         save_path, _ = QFileDialog.getSaveFileName(self, "保存结果", "", "Excel文件 (*.xlsx)")
         if save_path:
             self.worker = WorkerThread(self.temp_config, self.input_file, save_path)
-            self.worker.signals.progress.connect(self.update_progress)
-            self.worker.signals.finished.connect(lambda: self.btn_process.setEnabled(True))
+            self.worker.signals.progress_event.connect(self.update_progress)
+            self.worker.signals.finished.connect(lambda: self.set_running(False))
             self.worker.signals.error.connect(self.handle_error)
+            self.worker.signals.cancelled.connect(self.handle_cancelled)
             self.worker.start()
-            self.btn_process.setEnabled(False)
+            self.set_running(True)
+
+    def set_running(self, running):
+        """处理中时禁用开始按钮，启用暂停/取消"""
+        self.btn_process.setEnabled(not running)
+        self.btn_pause.setEnabled(running)
+        self.btn_cancel.setEnabled(running)
+        self.btn_pause.setText("暂停")
+
+    def toggle_pause(self):
+        control = self.worker.control
+        if control.paused:
+            control.resume()
+            self.btn_pause.setText("暂停")
+        else:
+            control.pause()
+            self.btn_pause.setText("继续")
+            self.progress_label.setText("暂停中，等待进行中的地址完成...")
+
+    def cancel_processing(self):
+        self.worker.control.cancel()
+        self.btn_pause.setEnabled(False)
+        self.btn_cancel.setEnabled(False)
+        self.progress_label.setText("正在取消，等待进行中的地址完成...")
+
+    def handle_cancelled(self):
+        self.set_running(False)
+        self.btn_process.setText("开始处理")
+        self.progress_label.setText("已取消。已获取的数据已保存，以相同文件和配置重新处理时将跳过这些地址")
 
-    def update_progress(self, percent, message):
-        self.btn_process.setText(f"处理中... {percent}% ({message})")
+    def update_progress(self, event):
+        self.btn_process.setText(f"处理中... {event.percent}% ({STAGE_NAMES.get(event.stage, event.stage)})")
+        self.progress_label.setText(format_event(event))
 
     def handle_error(self, message):
         QMessageBox.critical(self, "错误", message)
-        self.btn_process.setEnabled(True)
+        self.set_running(False)
         self.btn_process.setText("开始处理")
 
     def auto_check_update(self):
@@ -0,0 +1,189 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+运行指标：计数器、延迟直方图与各环节耗时
+
+记录的指标：
+- baidu_api_calls_total{endpoint}：各接口请求数
+- baidu_api_status_total{endpoint, status}：百度返回的 status 分布
+- baidu_api_errors_total{endpoint}：网络异常（超时、连接失败、重试用尽）
+- baidu_api_throttle_exhausted_total{endpoint}：并发超限重试次数用尽而放弃的请求
+- baidu_api_latency_seconds{endpoint}：单次请求延迟直方图
+- cache_lookups_total{cache, result}：各缓存命中情况，result 为 hit / miss / coalesced（等待其他线程的同一请求）
+- stage_seconds_total{stage}：各环节累计耗时
+- rows_processed_total、sheets_written_total：加工行数与写出的Sheet数
+
+运行结束后可导出为JSON，或导出为Prometheus文本格式供采集。
+"""
+
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# 延迟直方图分桶（秒），与Prometheus客户端默认分桶一致
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # {指标名: {标签键: 值}}
+        self._counters = {}
+        # {指标名: {标签键: [各分桶计数..., 总数, 总和]}}
+        self._histograms = {}
+
+    def inc(self, name, labels=None, value=1):
+        """计数器累加"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        """直方图记录一个观测值"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    @contextmanager
+    def timer(self, stage):
+        """累计一个环节的耗时：with metrics.timer("fetch"): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc("stage_seconds_total", {"stage": stage}, time.perf_counter() - started)
+
+    def value(self, name, labels=None):
+        """读取计数器当前值"""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def total(self, name, **match):
+        """计数器所有序列之和；match 指定时只统计标签匹配的序列，如 total("cache_lookups_total", result="hit")"""
+        wanted = {(str(k), str(v)) for k, v in match.items()}
+        with self._lock:
+            return sum(
+                value for key, value in self._counters.get(name, {}).items() if wanted <= set(key)
+            )
+
+    def to_dict(self):
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in sorted(series.items())]
+                for name, series in sorted(self._counters.items())
+            }
+            histograms = {}
+            for name, series in sorted(self._histograms.items()):
+                histograms[name] = [
+                    {
+                        "labels": dict(key),
+                        "count": state[-2],
+                        "sum": state[-1],
+                        "buckets": {str(bound): count for bound, count in zip(self.buckets, state)},
+                    }
+                    for key, state in sorted(series.items())
+                ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self, path=None):
+        """导出JSON；传入 path 时写入文件"""
+        text = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self, path=None):
+        """导出Prometheus文本格式；传入 path 时写入文件"""
+        lines = []
+        data = self.to_dict()
+        for name, series in data["counters"].items():
+            lines.append(f"# TYPE {name} counter")
+            for sample in series:
+                lines.append(f"{name}{_format_labels(sample['labels'])} {sample['value']}")
+        for name, series in data["histograms"].items():
+            lines.append(f"# TYPE {name} histogram")
+            for sample in series:
+                for bound, count in sample["buckets"].items():
+                    labels = _format_labels(dict(sample["labels"], le=bound))
+                    lines.append(f"{name}_bucket{labels} {count}")
+                labels = _format_labels(dict(sample["labels"], le="+Inf"))
+                lines.append(f"{name}_bucket{labels} {sample['count']}")
+                lines.append(f"{name}_sum{_format_labels(sample['labels'])} {sample['sum']}")
+                lines.append(f"{name}_count{_format_labels(sample['labels'])} {sample['count']}")
+        text = "\n".join(lines) + "\n"
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def export(self, options):
+        """
+        按配置导出
+        :param options: 配置中的 metrics，如 {"json": "metrics.json", "prometheus": "metrics.prom"}
+        """
+        options = options or {}
+        if options.get("json"):
+            self.to_json(options["json"])
+        if options.get("prometheus"):
+            self.to_prometheus(options["prometheus"])
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class NullMetrics:
+    """不记录任何指标（未传入注册表时使用）"""
+
+    def inc(self, name, labels=None, value=1):
+        pass
+
+    def observe(self, name, value, labels=None):
+        pass
+
+    @contextmanager
+    def timer(self, stage):
+        yield
+
+    def total(self, name, **match):
+        return 0
+
+
+NULL_METRICS = NullMetrics()
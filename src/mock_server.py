@@ -0,0 +1,253 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+本地模拟百度地图接口（只用于压测与联调，不消耗真实配额）
+
+实现 /geocoding/v3、/reverse_geocoding/v3、/place/v2/search，响应结构与百度接口一致。
+同一请求参数总是返回相同的数据，可配置延迟、错误率与配额：
+- latency / jitter：每次响应的延迟与随机抖动（毫秒）
+- error_rate：返回HTTP 503的比例（由客户端的传输层重试处理）
+- concurrency_error_rate：返回 status 401（并发超限）的比例
+- max_concurrency：同时处理的请求数上限，超出的请求返回 status 401（模拟百度的并发配额）
+- quota：每个AK的请求上限，超出后返回 status 302（当日配额超限）
+
+用法：
+    python src/mock_server.py --port 8765 --latency 50
+"""
+
+import sys
+import json
+import time
+import math
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# 模拟地理编码的坐标范围（北京市区附近）
+BASE_LNG, BASE_LAT = 116.2, 39.8
+SPAN = 0.4
+METERS_PER_DEGREE = 111320.0
+
+
+def _seed(*parts):
+    return int(hashlib.md5("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:12], 16)
+
+
+def geocode(address):
+    rnd = random.Random(_seed("geocode", address))
+    return {
+        "status": 0,
+        "result": {
+            "location": {"lng": round(BASE_LNG + rnd.random() * SPAN, 6),
+                         "lat": round(BASE_LAT + rnd.random() * SPAN, 6)},
+            "precise": 1,
+            "confidence": 80,
+            "level": "门址"
+        }
+    }
+
+
+def reverse_geocode(location):
+    rnd = random.Random(_seed("reverse", location))
+    district = rnd.choice(["东城区", "西城区", "朝阳区", "海淀区", "丰台区"])
+    return {
+        "status": 0,
+        "result": {
+            "formatted_address": f"北京市{district}模拟路{rnd.randint(1, 300)}号",
+            "addressComponent": {"city": "北京市", "district": district}
+        }
+    }
+
+
+def place_search(query, location, radius, page_size, page_num):
+    """围绕检索中心随机生成 total 个POI（同一检索中心与检索词结果固定），按距离排序后分页返回"""
+    lat, lng = (float(v) for v in location.split(","))
+    rnd = random.Random(_seed("place", query, location, radius))
+    total = rnd.randint(0, 60)
+    pois = []
+    for i in range(total):
+        distance = rnd.uniform(10, radius)
+        angle = rnd.uniform(0, 2 * math.pi)
+        d_lat = distance * math.sin(angle) / METERS_PER_DEGREE
+        d_lng = distance * math.cos(angle) / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+        pois.append({
+            "uid": f"{_seed(query, location, i):x}",
+            "name": f"{query}{i + 1}",
+            "address": f"模拟路{rnd.randint(1, 300)}号;{rnd.randint(1, 900)}路",
+            "location": {"lng": round(lng + d_lng, 6), "lat": round(lat + d_lat, 6)},
+            "detail_info": {"distance": int(distance)}
+        })
+    pois.sort(key=lambda poi: poi["detail_info"]["distance"])
+    page = pois[page_num * page_size:(page_num + 1) * page_size]
+    return {"status": 0, "message": "ok", "total": total, "results": page}
+
+
+class MockBaiduServer:
+    """在后台线程运行的模拟服务"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0, jitter=0,
+                 error_rate=0.0, concurrency_error_rate=0.0, quota=None, seed=0, max_concurrency=None):
+        """
+        :param port: 0 表示自动选择空闲端口
+        :param latency: 平均延迟（毫秒）
+        :param quota: 每个AK的请求上限，None 表示不限
+        """
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.error_rate = error_rate
+        self.concurrency_error_rate = concurrency_error_rate
+        self.quota = quota
+        self.max_concurrency = max_concurrency
+        self._in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # 服务端统计：{接口路径: 请求数}、{AK: 请求数}
+        self.calls = {}
+        self.ak_calls = {}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-baidu", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _draw(self):
+        """一次请求的 (延迟秒数, 随机数)"""
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            return delay, self._random.random()
+
+    def respond(self, path, params):
+        """
+        :return: (HTTP状态码, 响应体dict)
+        """
+        ak = params.get("ak", "")
+        with self._lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+            used = self.ak_calls[ak] = self.ak_calls.get(ak, 0) + 1
+            self._in_flight += 1
+            over_limit = self.max_concurrency is not None and self._in_flight > self.max_concurrency
+        try:
+            return self._respond(path, params, used, over_limit)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _respond(self, path, params, used, over_limit):
+        delay, roll = self._draw()
+        if delay:
+            time.sleep(delay)
+        if over_limit:
+            return 200, {"status": 401, "message": "当前并发量已经超过约定并发配额"}
+        if roll < self.error_rate:
+            return 503, {"status": 1, "message": "服务内部错误"}
+        if roll < self.error_rate + self.concurrency_error_rate:
+            return 200, {"status": 401, "message": "当前并发量已经超过约定并发配额"}
+        if self.quota is not None and used > self.quota:
+            return 200, {"status": 302, "message": "天配额超限，限制访问"}
+
+        if path == "/geocoding/v3":
+            return 200, geocode(params.get("address", ""))
+        if path == "/reverse_geocoding/v3":
+            return 200, reverse_geocode(params.get("location", ""))
+        if path == "/place/v2/search":
+            return 200, place_search(
+                params.get("query", ""),
+                params.get("location", "0,0"),
+                int(params.get("radius", 1000)),
+                int(params.get("page_size", 10)),
+                int(params.get("page_num", 0))
+            )
+        return 404, {"status": 3, "message": "服务不存在"}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 响应头与响应体分两次写出，关闭Nagle避免与延迟确认叠加出额外的40ms
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                code, body = server.respond(url.path.rstrip("/"), params)
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟百度地图接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0, help="平均延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="延迟抖动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="HTTP 503 的比例")
+    parser.add_argument("--concurrency-error-rate", type=float, default=0.0, help="status 401 的比例")
+    parser.add_argument("--quota", type=int, help="每个AK的请求上限")
+    parser.add_argument("--max-concurrency", type=int, help="同时处理的请求数上限，超出返回401")
+    args = parser.parse_args(argv)
+
+    server = MockBaiduServer(
+        args.host, args.port, args.latency, args.jitter,
+        args.error_rate, args.concurrency_error_rate, args.quota,
+        max_concurrency=args.max_concurrency
+    )
+    print(f"模拟服务已启动: {server.url}（Ctrl+C 退出）", file=sys.stderr)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""处理流程：获取数据 → 数据加工 → 生成Excel（GUI与命令行共用，不依赖Qt）"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from api_client import (
+    BaiduMapClient, API_BASE_URL, DEFAULT_MAX_WORKERS, DEFAULT_TIMEOUT, DEFAULT_RETRIES, DEFAULT_MAX_PAGES
+)
+from cache_store import open_cache
+from query_planner import QueryPlan
+from data_processor import DataProcessor
+from excel_report_writer import ExcelWriter, ExcelStreamWriter
+from template_loader import load_template
+from journal import FetchJournal
+from address_normalizer import AddressNormalizer
+from metrics import MetricsRegistry
+from progress import ProgressTracker, format_event
+from job_control import JobControl, JobCancelled, POLL_INTERVAL
+from grid_snap import GridSnapper
+from concurrency import AIMDLimiter
+
+
+def build_client(config, on_call=None, metrics=None):
+    """
+    按配置文件创建 BaiduMapClient
+    :param on_call: 请求回调 on_call(path, 耗时秒数, status)，见 BaiduMapClient
+    :param metrics: 指标注册表，不传时客户端自建
+    """
+    options = config["config"]
+    pagination = options.get("pagination", {})
+    poi_backend = None
+    if options.get("poi_index", {}).get("path"):
+        from poi_index import PoiIndex
+        poi_backend = PoiIndex.load(options["poi_index"]["path"])
+    return BaiduMapClient(
+        options.get("ak_pool") or options["ak"],
+        max_workers=options.get("max_workers", DEFAULT_MAX_WORKERS),
+        cache=open_cache(options.get("cache")),
+        pool_size=options.get("pool_size"),
+        timeout=options.get("timeout", DEFAULT_TIMEOUT),
+        retries=options.get("retries", DEFAULT_RETRIES),
+        paginate=pagination.get("enabled", False),
+        max_pages=pagination.get("max_pages", DEFAULT_MAX_PAGES),
+        normalizer=AddressNormalizer.from_config(options.get("address_normalization")),
+        snapper=GridSnapper.from_config(options.get("grid_snap")),
+        poi_backend=poi_backend,
+        base_url=options.get("base_url", API_BASE_URL),
+        on_call=on_call,
+        metrics=metrics,
+        limiter=AIMDLimiter.from_config(
+            options.get("adaptive_concurrency"),
+            options.get("max_workers", DEFAULT_MAX_WORKERS),
+            options.get("pool_size")
+        )
+    )
+
+
+class Pipeline:
+    def __init__(self, config, template_path, output_file, progress_callback=None, client=None,
+                 metrics=None, progress_event_callback=None, control=None, executor=None):
+        """
+        :param progress_callback: progress_callback(百分比, 描述)
+        :param progress_event_callback: progress_event_callback(progress.ProgressEvent)，
+                                        包含当前环节、完成数、速率、缓存命中率与预计剩余时间
+        :param client: 共用的 BaiduMapClient，不传时按配置新建并在结束时关闭
+        :param metrics: 指标注册表，不传时使用共用客户端的注册表或新建
+        :param control: job_control.JobControl，用于暂停/继续/取消；取消时 run 抛出 JobCancelled，
+                        已获取的地址保留在断点日志中
+        :param executor: 共用的地址线程池（多个任务共用同一客户端时），不传时每次运行新建
+        """
+        self.config = config
+        self.template_path = template_path
+        self.output_file = output_file
+        self.progress_callback = progress_callback
+        self.client = client
+        self.control = control or JobControl()
+        self.executor = executor
+        if metrics is None:
+            metrics = client.metrics if client is not None else MetricsRegistry()
+        self.metrics = metrics
+        self.tracker = ProgressTracker(metrics, listeners=[self._forward_progress, progress_event_callback])
+        self.raw_data = {}
+        self.total_groups = 0
+
+    def run(self):
+        # 先编译处理计划，比较规则有误时在请求API之前报错
+        processing_plan = DataProcessor.compile(self.config)
+
+        self.report_rule_gaps(processing_plan)
+
+        # 模板只读取一次，后续环节共享
+        self.tracker.start_stage("load", 1, message="读取模板...")
+        with self.metrics.timer("template_load"):
+            template_df = load_template(self.template_path)
+        streaming = self.config["config"].get("streaming", False)
+        if streaming:
+            # 流式模式按分组顺序获取，只获取报告中会用到的小区
+            groups = ExcelWriter.index_groups(template_df)
+            addresses = list(dict.fromkeys(
+                community for members in groups.values() for _, community in members
+            ))
+        else:
+            addresses = template_df['小区'].dropna().unique()
+
+        if streaming:
+            processed_data = self._run_streaming_job(addresses, groups, processing_plan)
+        else:
+            processed_data = self.fetch(
+                addresses, on_complete=lambda raw_data: self.process_and_write(template_df, processing_plan)
+            )
+
+        self.metrics.export(self.config["config"].get("metrics"))
+        self.tracker.finish("处理完成")
+        return processed_data
+
+    def fetch(self, addresses, on_complete=None):
+        """
+        获取原始数据，结果按 addresses 顺序存入 raw_data
+        :param on_complete: on_complete(raw_data)，获取完成后调用（如加工写出、写分片文件），
+                            成功返回后才删除断点日志，中途失败时下次运行可从断点继续
+        :return: on_complete 的返回值；未传时返回 raw_data
+        """
+        journal = self._open_journal(addresses)
+        owns_client = self.client is None
+        client = build_client(self.config, metrics=self.metrics) if owns_client else self.client
+        try:
+            with self.metrics.timer("fetch"):
+                self._fetch(client, addresses, journal)
+        finally:
+            if owns_client:
+                client.close()
+            if journal:
+                journal.close()
+
+        result = on_complete(self.raw_data) if on_complete else self.raw_data
+        if journal:
+            journal.discard()
+        return result
+
+    def _run_streaming_job(self, addresses, groups, processing_plan):
+        journal = self._open_journal(addresses)
+        owns_client = self.client is None
+        client = build_client(self.config, metrics=self.metrics) if owns_client else self.client
+        try:
+            self.total_groups = len(groups)
+            with self.metrics.timer("streaming"):
+                processed_data = self._run_streaming(client, addresses, groups, processing_plan, journal)
+        finally:
+            if owns_client:
+                client.close()
+            if journal:
+                journal.close()
+        if journal:
+            journal.discard()
+        return processed_data
+
+    def _open_journal(self, addresses):
+        """断点日志：同一地址列表与配置再次运行时跳过已完成的地址"""
+        journal_options = self.config["config"].get("journal", {})
+        if not journal_options.get("enabled", True):
+            return None
+        return FetchJournal.for_job(addresses, self.config, journal_options.get("dir"))
+
+    def process_and_write(self, template_df, processing_plan):
+        """全量模式：全部获取完成后统一加工 raw_data 并生成Excel"""
+        self.tracker.start_stage("process", len(self.raw_data), message="数据加工中...")
+        processed_data = DataProcessor.process(
+            self.raw_data, self.config, plan=processing_plan, metrics=self.metrics
+        )
+        self.tracker.advance(len(processed_data))
+
+        self.total_groups = template_df['分组'].nunique()
+        self.tracker.start_stage("write", self.total_groups, message=f"开始生成{self.total_groups}个分组...")
+        ExcelWriter.write(
+            self.output_file,
+            processed_data,
+            template_df,
+            self.config,
+            progress_callback=self._update_excel_progress,
+            columns=processing_plan.columns,
+            metrics=self.metrics
+        )
+        return processed_data
+
+    def _run_streaming(self, client, addresses, groups, processing_plan, journal=None):
+        """
+        流式模式：每个地址获取完成后立即加工并交给 ExcelStreamWriter，原始数据随即释放。
+        在途地址数不超过 queue_size，内存占用与模板规模无关。
+        :return: None（加工结果已写出，不在内存中保留）
+        """
+        items = self.config["config"]["items"]
+        total_addresses = len(addresses)
+        plan = QueryPlan(items)
+
+        sink = ExcelStreamWriter(
+            self.output_file, groups, self.config, processing_plan.columns,
+            progress_callback=lambda current, total: self._emit(f"已写出分组{current}/{total}"),
+            metrics=self.metrics
+        )
+
+        def consume(address, raw):
+            row = None
+            if raw:
+                row = DataProcessor.process(
+                    {address: raw}, self.config, plan=processing_plan, metrics=self.metrics
+                )[address]
+            sink.add(address, row)
+
+        def on_result(address, raw):
+            if raw and journal:
+                journal.append(address, raw)
+            consume(address, raw)
+            self.tracker.advance(message=f"{address[:10]}...")
+
+        try:
+            # 先消化断点日志中已完成的地址
+            done = set()
+            if journal:
+                for address, raw in journal.entries():
+                    if address not in done:
+                        done.add(address)
+                        consume(address, raw)
+            remaining = [address for address in addresses if address not in done]
+            self.tracker.start_stage("streaming", total_addresses, completed=len(done))
+            if done:
+                self._emit(f"从断点恢复：已完成{len(done)}个地址，剩余{len(remaining)}个")
+            self._emit(plan.summary(len(remaining)))
+            self._report_normalization(client, remaining)
+
+            self._dispatch(client, remaining, plan, on_result)
+            self._emit("保存Excel文件...")
+            sink.close()
+        except BaseException:
+            # 取消或出错时不留下临时文件与不完整的输出文件（已获取的地址保留在断点日志中）
+            sink.discard()
+            raise
+        return None
+
+    def _fetch(self, client, addresses, journal=None):
+        """并发获取所有地址的原始数据，结果按模板中的地址顺序存入 raw_data"""
+        items = self.config["config"]["items"]
+
+        # 从断点日志恢复已完成的地址
+        address_set = set(addresses)
+        fetched = journal.load() if journal else {}
+        fetched = {address: raw for address, raw in fetched.items() if address in address_set}
+        pending = [address for address in addresses if address not in fetched]
+        self.tracker.start_stage("fetch", len(addresses), completed=len(fetched))
+        if fetched:
+            message = f"从断点恢复：已完成{len(fetched)}个地址，剩余{len(pending)}个"
+            self._emit(message)
+
+        # 预先生成检索计划并展示请求数
+        plan = QueryPlan(items)
+        self._emit(plan.summary(len(pending)))
+        self._report_normalization(client, pending)
+
+        def on_result(address, raw):
+            if raw:
+                fetched[address] = raw
+                if journal:
+                    journal.append(address, raw)
+            self.tracker.advance(message=f"{address[:10]}...")
+
+        # 多个地址同时在途，按完成顺序汇报进度
+        self._dispatch(client, pending, plan, on_result)
+
+        if client.paginate:
+            for field_name, stats in client.pagination_report(plan).items():
+                if stats["pages"]:
+                    message = f"{field_name}: 共{stats['pages']}页，翻页额外请求{stats['extra_calls']}次"
+                    self._emit(message)
+
+        # 按模板中的地址顺序整理结果
+        for address in addresses:
+            if address in fetched:
+                self.raw_data[address] = fetched[address]
+
+    def _dispatch(self, client, addresses, plan, on_result):
+        """
+        多个地址同时在途（不超过 queue_size），按完成顺序调用 on_result(地址, 原始数据)
+        暂停时停止派发、在途地址完成后等待；取消时停止派发，在途地址的请求不再重试，结束后抛出 JobCancelled
+        """
+        items = self.config["config"]["items"]
+        queue_size = self.config["config"].get("queue_size") or client.max_workers * 2
+        control = self.control
+        pending = deque(addresses)
+        paused_reported = False
+
+        owns_pool = self.executor is None
+        if owns_pool:
+            pool = ThreadPoolExecutor(max_workers=client.max_workers, thread_name_prefix="baidu-address")
+        else:
+            pool = self.executor
+        try:
+            in_flight = {}
+            while True:
+                if not control.paused and not control.cancelled:
+                    if paused_reported:
+                        self._emit("已继续")
+                        paused_reported = False
+                    while pending and len(in_flight) < queue_size:
+                        address = pending.popleft()
+                        in_flight[pool.submit(client.get_location_data, address, items, plan, control)] = address
+
+                if not in_flight:
+                    if control.cancelled or not pending:
+                        break
+                    # 暂停中且在途地址已全部完成
+                    if not paused_reported:
+                        self._emit(f"已暂停，剩余{len(pending)}个地址")
+                        paused_reported = True
+                    control.wait_while_paused()
+                    self.tracker.heartbeat()
+                    continue
+
+                finished, _ = wait(in_flight, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                if not finished:
+                    # 一段时间没有地址完成（限流、等待AK、慢请求）时也定期更新速率与剩余时间
+                    self.tracker.heartbeat()
+                for future in finished:
+                    address = in_flight.pop(future)
+                    try:
+                        raw = future.result()
+                    except JobCancelled:
+                        # 取消时中止的地址不计入结果（也不写入断点日志），下次运行重新获取
+                        continue
+                    on_result(address, raw)
+        finally:
+            if owns_pool:
+                pool.shutdown(wait=True)
+
+        control.check()
+
+    def _report_normalization(self, client, addresses):
+        """展示地址归一化合并了多少次地理编码"""
+        if not client.normalizer:
+            return
+        total, merged, saved = client.normalizer.merge_report(addresses)
+        if saved:
+            message = f"地址归一化：{total}个地址合并为{merged}个，节省{saved}次地理编码"
+            self._emit(message)
+
+    def _update_excel_progress(self, current, total):
+        """Excel生成进度回调"""
+        self.tracker.advance(message=f"正在生成分组{current}/{total}")
+
+    def _emit(self, message):
+        """在当前环节的进度上附带一条描述"""
+        self.tracker.emit(message)
+
+    def report_rule_gaps(self, processing_plan):
+        """比较规则存在未覆盖的区间时通过进度事件提示一次"""
+        for name, gaps in processing_plan.rule_gaps:
+            ranges = "、".join(f"[{lower:g}, {upper:g})" for lower, upper in gaps)
+            self.tracker.emit(f"提示：{name}的比较规则存在未覆盖的区间 {ranges}，落在其中的值没有等级")
+
+    def _forward_progress(self, event):
+        """兼容 progress_callback(百分比, 描述)"""
+        if self.progress_callback:
+            self.progress_callback(event.percent, event.message or format_event(event))
@@ -0,0 +1,235 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+离线POI索引：由已有的POI数据（CSV/GeoJSON导出）建立网格空间索引，
+作为 BaiduMapClient 的POI检索后端，检索结果与百度接口结构相同，无需请求API。
+
+索引目录结构：
+- coords.npy：POI坐标 (N, 2)，按网格排序，加载时内存映射
+- cells.npy：各网格的键（升序）
+- starts.npy：各网格在 coords 中的起始位置（长度为网格数+1）
+- meta.json：网格边长与POI属性（名称、分类、地址、uid）
+坐标需与百度接口一致（BD09），否则距离会有数百米偏差。
+"""
+
+import os
+import csv
+import json
+import math
+import threading
+
+import numpy as np
+
+from geo_distance import lambert
+
+DEFAULT_CELL_SIZE = 500
+METERS_PER_DEGREE = 111320.0
+# 网格行列号偏移，保证键为非负整数
+_OFFSET = 1 << 20
+_ROW_SHIFT = 1 << 21
+
+# CSV 列名：按顺序尝试，取第一个存在的列
+NAME_COLUMNS = ("name", "名称")
+LNG_COLUMNS = ("lng", "经度", "longitude")
+LAT_COLUMNS = ("lat", "纬度", "latitude")
+TAG_COLUMNS = ("tag", "category", "type", "分类", "类型")
+ADDRESS_COLUMNS = ("address", "地址")
+UID_COLUMNS = ("uid", "id")
+
+
+def load_records(path):
+    """
+    读取POI数据
+    :param path: .csv（含 name/lng/lat 列，可选 tag/address/uid）或 .geojson/.json（Point要素）
+    :return: [{"name", "lng", "lat", "tag", "address", "uid"}, ...]
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return _load_csv(path)
+    if ext in (".geojson", ".json"):
+        return _load_geojson(path)
+    raise ValueError(f"不支持的POI数据格式: {ext}，支持 .csv、.geojson")
+
+
+def _pick(row, columns, default=""):
+    for column in columns:
+        if row.get(column) not in (None, ""):
+            return row[column]
+    return default
+
+
+def _load_csv(path):
+    records = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            lng, lat = _pick(row, LNG_COLUMNS, None), _pick(row, LAT_COLUMNS, None)
+            if lng is None or lat is None:
+                continue
+            records.append({
+                "name": _pick(row, NAME_COLUMNS),
+                "lng": float(lng),
+                "lat": float(lat),
+                "tag": _pick(row, TAG_COLUMNS),
+                "address": _pick(row, ADDRESS_COLUMNS),
+                "uid": _pick(row, UID_COLUMNS),
+            })
+    return records
+
+
+def _load_geojson(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    records = []
+    for feature in data.get("features", []):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") != "Point":
+            continue
+        lng, lat = geometry["coordinates"][:2]
+        properties = feature.get("properties") or {}
+        records.append({
+            "name": _pick(properties, NAME_COLUMNS),
+            "lng": float(lng),
+            "lat": float(lat),
+            "tag": _pick(properties, TAG_COLUMNS),
+            "address": _pick(properties, ADDRESS_COLUMNS),
+            "uid": str(_pick(properties, UID_COLUMNS, feature.get("id", ""))),
+        })
+    return records
+
+
+class PoiIndex:
+    """网格空间索引：按坐标所在网格排序，检索时只计算半径覆盖的网格内的POI"""
+
+    def __init__(self, coords, cells, starts, records, cell_size):
+        self.coords = coords
+        self.cells = cells
+        self.starts = starts
+        self.records = records
+        self.cell_size = float(cell_size)
+        # 各检索词匹配的POI掩码，首次检索时生成
+        self._masks = {}
+        self._masks_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, records, cell_size=DEFAULT_CELL_SIZE):
+        """由POI记录建立索引"""
+        coords = np.array([(r["lng"], r["lat"]) for r in records], dtype=float).reshape(-1, 2)
+        keys = cls._cell_keys(coords[:, 0], coords[:, 1], cell_size)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        cells, first = np.unique(keys, return_index=True)
+        starts = np.append(first, len(keys)).astype(np.int64)
+        records = [records[i] for i in order.tolist()]
+        return cls(coords[order], cells, starts, records, cell_size)
+
+    @classmethod
+    def from_file(cls, path, cell_size=DEFAULT_CELL_SIZE):
+        return cls.build(load_records(path), cell_size)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "coords.npy"), self.coords)
+        np.save(os.path.join(directory, "cells.npy"), self.cells)
+        np.save(os.path.join(directory, "starts.npy"), self.starts)
+        meta = {
+            "cell_size": self.cell_size,
+            "fields": ["name", "tag", "address", "uid"],
+            "records": [[r.get("name", ""), r.get("tag", ""), r.get("address", ""), r.get("uid", "")]
+                        for r in self.records],
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory):
+        """加载索引，坐标数组以内存映射方式打开"""
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        records = [dict(zip(meta["fields"], values)) for values in meta["records"]]
+        return cls(
+            np.load(os.path.join(directory, "coords.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "cells.npy")),
+            np.load(os.path.join(directory, "starts.npy")),
+            records,
+            meta["cell_size"]
+        )
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def _cell_keys(lng, lat, cell_size):
+        """网格键：纬度方向按 cell_size 米分行，经度方向按同样的度数分列"""
+        step = cell_size / METERS_PER_DEGREE
+        rows = np.floor(np.asarray(lat) / step).astype(np.int64) + _OFFSET
+        cols = np.floor(np.asarray(lng) / step).astype(np.int64) + _OFFSET
+        return rows * _ROW_SHIFT + cols
+
+    def _mask(self, query):
+        """名称或分类中包含检索词的POI"""
+        mask = self._masks.get(query)
+        if mask is None:
+            mask = np.array([query in r.get("tag", "") or query in r.get("name", "") for r in self.records],
+                            dtype=bool)
+            with self._masks_lock:
+                self._masks[query] = mask
+        return mask
+
+    def _candidates(self, coord, radius):
+        """半径外接矩形覆盖的网格内的POI下标"""
+        step = self.cell_size / METERS_PER_DEGREE
+        lng, lat = float(coord[0]), float(coord[1])
+        lat_span = radius / METERS_PER_DEGREE
+        lng_span = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        row_lo, row_hi = (math.floor((lat + d) / step) + _OFFSET for d in (-lat_span, lat_span))
+        col_lo, col_hi = (math.floor((lng + d) / step) + _OFFSET for d in (-lng_span, lng_span))
+
+        ranges = []
+        for row in range(row_lo, row_hi + 1):
+            # 同一行的网格键连续，二分查找一次取出整行区间
+            lo = np.searchsorted(self.cells, row * _ROW_SHIFT + col_lo, side="left")
+            hi = np.searchsorted(self.cells, row * _ROW_SHIFT + col_hi, side="right")
+            if lo < hi:
+                ranges.append(np.arange(self.starts[lo], self.starts[hi]))
+        return np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+
+    def search_poi(self, query, coord, radius):
+        """
+        与 BaiduMapClient._search_poi 相同的接口
+        :return: 半径内名称或分类包含 query 的POI，按距离升序，结构与百度检索结果一致
+        """
+        index = self._candidates(coord, radius)
+        if len(index):
+            index = index[self._mask(query)[index]]
+        if not len(index):
+            return []
+        points = np.asarray(self.coords[index])
+        meters = lambert(float(coord[0]), float(coord[1]), points[:, 0], points[:, 1])
+        inside = meters <= radius
+        index, points, meters = index[inside], points[inside], meters[inside]
+        order = np.argsort(meters, kind="stable")
+
+        results = []
+        for i in order.tolist():
+            record = self.records[int(index[i])]
+            results.append({
+                "uid": record.get("uid", ""),
+                "name": record.get("name", ""),
+                "address": record.get("address", ""),
+                "location": {"lng": float(points[i, 0]), "lat": float(points[i, 1])},
+                "detail_info": {"distance": int(round(meters[i])), "tag": record.get("tag", "")},
+            })
+        return results
@@ -0,0 +1,190 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+结构化进度：当前环节及其完成数、吞吐量、请求速率、缓存命中率与预计剩余时间
+GUI（WorkerSignals.progress_event）与命令行共用
+"""
+
+import time
+from collections import deque, namedtuple
+
+# 各环节在总进度条中占的区间（百分比）
+STAGE_RANGES = {
+    "load": (0, 0),
+    "fetch": (0, 70),
+    "process": (70, 90),
+    "write": (90, 100),
+    "streaming": (0, 99),
+    "done": (100, 100),
+}
+
+STAGE_NAMES = {
+    "load": "读取模板",
+    "fetch": "获取数据",
+    "process": "数据加工",
+    "write": "生成Excel",
+    "streaming": "获取并写出",
+    "done": "完成",
+}
+
+# 以地址为单位计数的环节（用于计算地址/秒）
+ADDRESS_STAGES = ("fetch", "streaming")
+
+# 速率按最近一段时间计算，反映当前是否被限流或卡住
+RATE_WINDOW = 30.0
+# 没有地址完成时（被限流、等待AK恢复、慢请求）至少每隔这么久发一次事件，速率与剩余时间随之更新
+HEARTBEAT_INTERVAL = 1.0
+
+ProgressEvent = namedtuple("ProgressEvent", [
+    "stage",             # 当前环节：load / fetch / process / write / streaming / done
+    "completed",         # 当前环节已完成数
+    "total",             # 当前环节总数
+    "percent",           # 总进度（0-100）
+    "message",           # 描述
+    "addresses_per_s",   # 最近的地址处理速率
+    "calls_per_s",       # 最近的API请求速率
+    "cache_hit_rate",    # 缓存命中率（0-1），尚无查询时为 None
+    "eta_s",             # 当前环节预计剩余秒数，无法估计时为 None
+    "elapsed_s",         # 已运行秒数
+])
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def format_event(event):
+    """单行文本：环节 完成/总数 · 速率 · 命中率 · 剩余时间"""
+    parts = [f"{STAGE_NAMES.get(event.stage, event.stage)} {event.completed}/{event.total}"]
+    if event.addresses_per_s:
+        parts.append(f"{event.addresses_per_s:.1f}地址/秒")
+    if event.calls_per_s:
+        parts.append(f"{event.calls_per_s:.1f}请求/秒")
+    if event.cache_hit_rate is not None:
+        parts.append(f"缓存命中{event.cache_hit_rate:.0%}")
+    if event.eta_s is not None:
+        parts.append(f"剩余{format_duration(event.eta_s)}")
+    text = " · ".join(parts)
+    return f"{text} | {event.message}" if event.message else text
+
+
+class ProgressTracker:
+    """
+    跟踪各环节进度并生成 ProgressEvent
+    速率由最近 RATE_WINDOW 秒内的完成数与请求数计算，请求数与缓存命中取自 metrics 注册表；
+    等待期间由 heartbeat 定期采样，长时间没有完成时速率逐渐下降、剩余时间相应变长
+    """
+
+    def __init__(self, metrics=None, listeners=()):
+        """
+        :param metrics: metrics.MetricsRegistry，不传时请求速率与命中率为空
+        :param listeners: 回调列表，每个事件调用 listener(event)
+        """
+        self.metrics = metrics
+        self.listeners = [listener for listener in listeners if listener]
+        self.started = time.monotonic()
+        self.stage = "load"
+        self.completed = 0
+        self.total = 0
+        self.addresses_per_s = 0.0
+        self._samples = deque()
+        self._last_emit = 0.0
+        self._last_message = ""
+
+    def start_stage(self, stage, total, completed=0, message=""):
+        self.stage = stage
+        self.total = total
+        self.completed = completed
+        self._samples.clear()
+        self._sample()
+        self.emit(message)
+
+    def advance(self, count=1, message=""):
+        self.completed += count
+        self._sample()
+        self.emit(message)
+
+    def heartbeat(self):
+        """距上次事件超过 HEARTBEAT_INTERVAL 时重新采样并发出事件（沿用上一条描述）"""
+        if time.monotonic() - self._last_emit < HEARTBEAT_INTERVAL:
+            return None
+        self._sample()
+        return self.emit(self._last_message)
+
+    def finish(self, message=""):
+        self.stage = "done"
+        self.completed = self.total
+        self.emit(message)
+
+    def emit(self, message=""):
+        event = self.snapshot(message)
+        self._last_emit = time.monotonic()
+        self._last_message = message
+        for listener in self.listeners:
+            listener(event)
+        return event
+
+    def snapshot(self, message=""):
+        now = time.monotonic()
+        low, high = STAGE_RANGES.get(self.stage, (0, 100))
+        fraction = self.completed / self.total if self.total else 0.0
+        percent = int(low + (high - low) * min(fraction, 1.0))
+
+        stage_rate = calls_per_s = 0.0
+        if len(self._samples) > 1:
+            (t0, done0, calls0), (t1, done1, calls1) = self._samples[0], self._samples[-1]
+            if t1 > t0:
+                stage_rate = (done1 - done0) / (t1 - t0)
+                calls_per_s = (calls1 - calls0) / (t1 - t0)
+        if self.stage in ADDRESS_STAGES:
+            self.addresses_per_s = stage_rate
+
+        remaining = self.total - self.completed
+        eta = remaining / stage_rate if stage_rate > 0 else (0.0 if remaining <= 0 else None)
+
+        return ProgressEvent(
+            stage=self.stage,
+            completed=self.completed,
+            total=self.total,
+            percent=percent,
+            message=message,
+            addresses_per_s=self.addresses_per_s,
+            calls_per_s=calls_per_s,
+            cache_hit_rate=self._cache_hit_rate(),
+            eta_s=eta,
+            elapsed_s=now - self.started,
+        )
+
+    def _sample(self):
+        now = time.monotonic()
+        calls = self.metrics.total("baidu_api_calls_total") if self.metrics else 0
+        self._samples.append((now, self.completed, calls))
+        while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW:
+            self._samples.popleft()
+
+    def _cache_hit_rate(self):
+        if not self.metrics:
+            return None
+        lookups = self.metrics.total("cache_lookups_total")
+        if not lookups:
+            return None
+        misses = self.metrics.total("cache_lookups_total", result="miss")
+        return (lookups - misses) / lookups
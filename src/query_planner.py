@@ -0,0 +1,129 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+DEFAULT_RADIUS = 1000
+
+# 每个地址固定的请求：地理编码 + 逆地理编码
+BASE_CALLS_PER_ADDRESS = 2
+
+# 字段 → 检索词
+# - None：不需要POI检索
+# - 字符串：单个检索词，字段数据为结果列表
+# - 列表：多个检索词，字段数据为 {检索词: 结果列表}
+FIELD_QUERIES = {
+    "位置": None,  # 由反向地理编码处理
+    "距最近商服中心的距离(公里)": "商场",
+    "商服网点聚集程度": ["商场", "超市", "便利店"],
+    "客流数量": "学校",
+    "居住氛围": "小区",
+    "道路通达程度": "道路",
+    "临街（路）状况": "道路",
+    "X米半径范围内公共交通线路数": "公交",
+    "距公交站点距离（米）": "公交站",
+    "距轨道站点距离（米）": "地铁站",
+    "公用设施条件(公里)": ["医院", "学校", "银行", "公园"],
+    "距商务中心的距离(公里)": "商务中心",
+    "商务聚集程度": "写字楼",
+    "距火车站的距离(公里)": "火车站",
+    "距最近货运火车站的距离(公里)": "货运站",
+    "距最近货运港口的距离(公里)": "港口",
+    "距长途车站/客运站点距离(公里)": "汽车站",
+    "距机场的距离(公里)": "机场",
+    "距高速公路出入口的距离(公里)": "高速出口",
+}
+
+
+class QueryPlan:
+    """
+    检索计划：根据启用的字段预先算出每个坐标需要的最少 (检索词, 半径) 组合，
+    每个组合只请求一次，再把结果分发给所有需要它的字段
+    """
+
+    def __init__(self, config_items):
+        self.fields = []
+        searches = []
+        for item in config_items:
+            if not item['enabled']:
+                continue
+            name = item['name']
+            if name not in FIELD_QUERIES:
+                raise KeyError(f"未知字段: {name}")
+            spec = FIELD_QUERIES[name]
+            radius = int(item.get('radius') or DEFAULT_RADIUS)
+            self.fields.append((name, spec, radius))
+            for query in self.spec_queries(spec):
+                if (query, radius) not in searches:
+                    searches.append((query, radius))
+        self.searches = searches
+        # 按检索词分组，半径从大到小：先取最大半径，小半径尽量由其结果推导
+        self.search_groups = {}
+        for query, radius in searches:
+            self.search_groups.setdefault(query, []).append(radius)
+        for radii in self.search_groups.values():
+            radii.sort(reverse=True)
+
+    @staticmethod
+    def spec_queries(spec):
+        if spec is None:
+            return []
+        if isinstance(spec, str):
+            return [spec]
+        return list(spec)
+
+    @property
+    def naive_calls_per_address(self):
+        """不合并时每个地址的请求数（每个字段单独请求）"""
+        return BASE_CALLS_PER_ADDRESS + sum(len(self.spec_queries(spec)) for _, spec, _ in self.fields)
+
+    @property
+    def calls_per_address(self):
+        """合并后每个地址的请求数（上限，小半径结果可由大半径推导时更少）"""
+        return BASE_CALLS_PER_ADDRESS + len(self.searches)
+
+    @property
+    def min_calls_per_address(self):
+        """所有小半径检索都能由最大半径结果推导时的请求数"""
+        return BASE_CALLS_PER_ADDRESS + len(self.search_groups)
+
+    def estimate_calls(self, address_count):
+        """整个任务的预计请求数（未计缓存命中）"""
+        return self.calls_per_address * address_count
+
+    def summary(self, address_count):
+        if self.min_calls_per_address < self.calls_per_address:
+            per_address = f"{self.min_calls_per_address}~{self.calls_per_address}"
+        else:
+            per_address = f"{self.calls_per_address}"
+        return (
+            f"检索计划：每个地址{per_address}次请求"
+            f"（合并前{self.naive_calls_per_address}次），"
+            f"{address_count}个地址预计最多{self.estimate_calls(address_count)}次"
+        )
+
+    def assemble(self, results):
+        """
+        把检索结果分发到各字段
+        :param results: {(检索词, 半径): POI列表}
+        :return: {字段名: 字段原始数据}，结构与逐字段请求时一致
+        """
+        field_data = {}
+        for name, spec, radius in self.fields:
+            if spec is None:
+                field_data[name] = None
+            elif isinstance(spec, str):
+                field_data[name] = results[(spec, radius)]
+            else:
+                field_data[name] = {query: results[(query, radius)] for query in spec}
+        return field_data
@@ -0,0 +1,200 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import datetime
+import threading
+
+# 单个AK默认QPS
+DEFAULT_QPS = 30
+
+# 百度返回的状态码分类（状态码位于JSON响应体的status字段）
+CONCURRENCY_STATUS = {401, 402}          # 并发超限：重试；未启用自适应并发时先短暂停用该AK
+DAILY_QUOTA_STATUS = {4, 302}            # 配额超限：停用到次日
+INVALID_KEY_STATUS = {5, 101, 102}       # AK非法/服务禁用：本次运行不再使用
+
+# 并发超限后的冷却时间（秒）
+CONCURRENCY_COOLDOWN = 1.0
+# 所有AK都停用时，最多等待多久恢复（秒），超过则放弃
+MAX_PARK_WAIT = 60.0
+
+
+class QuotaExhaustedError(RuntimeError):
+    """所有AK均已停用（配额用尽或AK无效）"""
+
+
+class ThrottledError(RuntimeError):
+    """同一请求连续多次返回并发超限，放弃该请求"""
+
+
+class TokenBucket:
+    """令牌桶：按固定速率补充令牌，容量即允许的突发请求数"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def wait_time(self, now):
+        """距离下一个令牌可用还需等待的秒数"""
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        if self.rate:
+            self.tokens -= 1
+
+
+class KeySlot:
+    """单个AK的限流与配额状态"""
+
+    def __init__(self, ak, qps=DEFAULT_QPS, daily_quota=None):
+        self.ak = ak
+        self.bucket = TokenBucket(qps)
+        self.daily_quota = daily_quota
+        self.used_today = 0
+        self.day = datetime.date.today()
+        self.parked_until = 0.0
+        self.disabled = False
+
+    def roll_day(self):
+        """跨天后重置当日用量与配额停用"""
+        today = datetime.date.today()
+        if today != self.day:
+            self.day = today
+            self.used_today = 0
+            self.parked_until = 0.0
+
+    def available(self, now):
+        if self.disabled or self.parked_until > now:
+            return False
+        return self.daily_quota is None or self.used_today < self.daily_quota
+
+
+class AKPool:
+    """
+    多AK轮换池
+    - 每个AK独立的令牌桶（QPS）与每日配额
+    - 轮询选择当前可立即发出请求的AK
+    - 按百度返回的状态码停用触发限制的AK
+    """
+
+    def __init__(self, slots):
+        if not slots:
+            raise ValueError("至少需要配置一个AK")
+        self.slots = slots
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, value):
+        """
+        支持以下配置形式：
+        - "ak字符串"
+        - {"ak": "...", "qps": 30, "daily_quota": 300000}
+        - 上述两种形式组成的列表
+        """
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        slots = []
+        for entry in value:
+            if isinstance(entry, dict):
+                slots.append(KeySlot(entry["ak"], entry.get("qps", DEFAULT_QPS), entry.get("daily_quota")))
+            elif entry:
+                slots.append(KeySlot(entry))
+        return cls(slots)
+
+    def acquire(self, control=None):
+        """
+        取得一个可用AK（必要时等待令牌），所有AK都不可用时抛出 QuotaExhaustedError
+        :param control: job_control.JobControl，等待AK恢复期间任务取消时立即抛出 JobCancelled
+        """
+        while True:
+            if control is not None:
+                control.check()
+            with self._lock:
+                now = time.monotonic()
+                best, best_index, best_wait = None, None, float("inf")
+                for offset in range(len(self.slots)):
+                    index = (self._cursor + offset) % len(self.slots)
+                    slot = self.slots[index]
+                    slot.roll_day()
+                    if not slot.available(now):
+                        continue
+                    wait = slot.bucket.wait_time(now)
+                    if wait < best_wait:
+                        best, best_index, best_wait = slot, index, wait
+                    if wait == 0:
+                        break
+
+                if best is not None and best_wait == 0:
+                    best.bucket.consume()
+                    best.used_today += 1
+                    self._cursor = best_index + 1
+                    return best
+
+                if best is not None:
+                    sleep_for = best_wait
+                else:
+                    sleep_for = self._next_ready(now)
+                    if sleep_for is None or sleep_for > MAX_PARK_WAIT:
+                        raise QuotaExhaustedError("所有AK均已达到配额上限或不可用")
+            if control is not None:
+                control.sleep(sleep_for)
+            else:
+                time.sleep(sleep_for)
+
+    def report(self, slot, status, park_on_concurrency=True):
+        """
+        根据响应状态码更新AK状态
+        :param park_on_concurrency: 并发超限时是否短暂停用该AK；
+                                    启用自适应并发时由 AIMDLimiter 降低并发，不再停用AK
+        :return: True 表示该请求因AK受限失败，应换一个AK重试
+        """
+        with self._lock:
+            if status in CONCURRENCY_STATUS:
+                if park_on_concurrency:
+                    slot.parked_until = max(slot.parked_until, time.monotonic() + CONCURRENCY_COOLDOWN)
+                return True
+            if status in DAILY_QUOTA_STATUS or 300 <= (status or 0) < 400:
+                slot.parked_until = time.monotonic() + self._seconds_until_tomorrow()
+                print(f"AK {slot.ak[:6]}*** 当日配额已用尽，暂停使用")
+                return True
+            if status in INVALID_KEY_STATUS or 200 <= (status or 0) < 300:
+                slot.disabled = True
+                print(f"AK {slot.ak[:6]}*** 无效或无权限(status={status})，停止使用")
+                return True
+            return False
+
+    def _next_ready(self, now):
+        """最早恢复的AK还需等待的秒数（没有可恢复的AK时返回None）"""
+        waits = [
+            slot.parked_until - now for slot in self.slots
+            if not slot.disabled and slot.parked_until > now
+            and (slot.daily_quota is None or slot.used_today < slot.daily_quota)
+        ]
+        return min(waits) if waits else None
+
+    @staticmethod
+    def _seconds_until_tomorrow():
+        now = datetime.datetime.now()
+        tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+        return (tomorrow - now).total_seconds()
@@ -0,0 +1,103 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from bisect import bisect_right
+from collections import namedtuple
+
+# 等级对应的数值评分
+LEVEL_SCORES = {'优': 5, '较优': 4, '一般': 3, '较差': 2, '差': 1}
+
+Interval = namedtuple("Interval", ["lower", "upper", "level"])
+
+
+class RuleError(ValueError):
+    """比较规则配置错误（区间重叠等）"""
+
+
+class RuleSet:
+    """
+    比较规则（左闭右开区间）
+    编译时按下界排序并检查重叠与空隙，取值时二分查找
+    """
+
+    def __init__(self, rules, field_name=""):
+        """
+        :param rules: {"优": {"min": 0, "max": 1.0}, ...}，min/max 为 None 表示不限；
+                      min、max 都为空的等级视为未设置
+        """
+        intervals = []
+        for level, condition in rules.items():
+            lower = condition.get("min")
+            upper = condition.get("max")
+            if lower is None and upper is None:
+                continue
+            lower = float("-inf") if lower is None else float(lower)
+            upper = float("inf") if upper is None else float(upper)
+            if lower >= upper:
+                raise RuleError(f"{field_name}的{level}范围无效: [{lower}, {upper})")
+            intervals.append(Interval(lower, upper, level))
+        intervals.sort(key=lambda interval: interval.lower)
+
+        # 相邻区间检查：重叠视为配置错误，空隙记录下来（落在空隙中的值没有等级）
+        self.gaps = []
+        for prev, cur in zip(intervals, intervals[1:]):
+            if prev.upper > cur.lower:
+                raise RuleError(f"{field_name}的{prev.level}与{cur.level}范围重叠")
+            if prev.upper < cur.lower:
+                self.gaps.append((prev.upper, cur.lower))
+
+        self.intervals = intervals
+        self._lowers = [interval.lower for interval in intervals]
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def level(self, value):
+        """单个数值的等级，没有匹配区间时返回空字符串"""
+        if value is None or not self.intervals:
+            return ""
+        index = bisect_right(self._lowers, value) - 1
+        if index >= 0 and value < self.intervals[index].upper:
+            return self.intervals[index].level
+        return ""
+
+    def evaluate_column(self, values):
+        """
+        整列取值
+        :param values: 数值列表，None 表示无数据
+        :return: (等级列表, 评分列表)，无等级时等级为空字符串、评分为 None
+        """
+        import numpy as np
+
+        if not self.intervals or not values:
+            return [""] * len(values), [None] * len(values)
+
+        array = np.array([np.nan if v is None else v for v in values], dtype=float)
+        lowers = np.array(self._lowers)
+        uppers = np.array([interval.upper for interval in self.intervals])
+        index = np.searchsorted(lowers, array, side="right") - 1
+        clipped = np.clip(index, 0, None)
+        matched = (index >= 0) & (array < uppers[clipped]) & ~np.isnan(array)
+
+        levels, scores = [], []
+        for ok, i in zip(matched.tolist(), clipped.tolist()):
+            if ok:
+                level = self.intervals[i].level
+                levels.append(level)
+                scores.append(LEVEL_SCORES.get(level))
+            else:
+                levels.append("")
+                scores.append(None)
+        return levels, scores
@@ -0,0 +1,178 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+分片执行：把一个模板的地址按哈希确定地分成 N 片，各片在独立进程（或其他机器、使用各自的AK）中获取，
+结果写入可合并的中间文件（JSON Lines），最后合并后统一加工并生成Excel，结果与单进程运行相同。
+
+中间文件格式：
+- 第一行：{"shard": 序号, "count": 分片数, "job": 任务指纹, "addresses": 本片地址数}
+- 之后每行：{"address": 地址, "raw": 原始数据}（与断点日志相同）
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from journal import job_fingerprint
+from rate_limiter import DEFAULT_QPS
+
+
+def shard_of(address, count):
+    """地址所属分片（md5取模，与进程、机器、Python版本无关）"""
+    digest = hashlib.md5(str(address).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % count
+
+
+def template_addresses(template_df):
+    """模板中需要获取的地址（与单进程运行的顺序一致）"""
+    return list(template_df['小区'].dropna().unique())
+
+
+def shard_addresses(addresses, index, count):
+    if not 0 <= index < count:
+        raise ValueError(f"分片序号应在 0 到 {count - 1} 之间")
+    return [address for address in addresses if shard_of(address, count) == index]
+
+
+def write_shard(path, raw_data, index, count, job):
+    """写入分片文件（先写临时文件再改名，中途退出不会留下不完整的分片）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        header = {"shard": index, "count": count, "job": job, "addresses": len(raw_data)}
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        for address, raw in raw_data.items():
+            f.write(json.dumps({"address": address, "raw": raw}, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+def read_shard(path):
+    """
+    :return: (header, {地址: 原始数据})
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        entries = {}
+        for line in f:
+            entry = json.loads(line)
+            entries[entry["address"]] = entry["raw"]
+    return header, entries
+
+
+def fetch_shard(config, template_path, index, count, output_path, progress_event_callback=None):
+    """
+    获取一个分片的地址并写入分片文件
+    :return: 本片获取成功的地址数
+    """
+    from template_loader import load_template
+    from pipeline import Pipeline
+
+    addresses = template_addresses(load_template(template_path))
+    job = job_fingerprint(addresses, config)
+    pipeline = Pipeline(config, template_path, None, progress_event_callback=progress_event_callback)
+    raw_data = pipeline.fetch(
+        shard_addresses(addresses, index, count),
+        on_complete=lambda raw: write_shard(output_path, raw, index, count, job) or raw
+    )
+    return len(raw_data)
+
+
+def merge_shards(config, template_path, shard_paths, output_file, progress_event_callback=None):
+    """
+    合并各分片结果，按模板顺序加工并生成Excel
+    会检查分片是否来自同一模板与配置、是否齐全
+    """
+    from template_loader import load_template
+    from data_processor import DataProcessor
+    from pipeline import Pipeline
+
+    processing_plan = DataProcessor.compile(config)
+    template_df = load_template(template_path)
+    addresses = template_addresses(template_df)
+    job = job_fingerprint(addresses, config)
+
+    fetched = {}
+    seen = set()
+    count = None
+    for path in shard_paths:
+        header, entries = read_shard(path)
+        if header["job"] != job:
+            raise ValueError(f"{os.path.basename(path)} 与当前模板或配置不一致")
+        if count is not None and header["count"] != count:
+            raise ValueError("分片数不一致")
+        count = header["count"]
+        seen.add(header["shard"])
+        fetched.update(entries)
+    missing = sorted(set(range(count or 0)) - seen)
+    if missing:
+        raise ValueError(f"缺少分片: {', '.join(str(i) for i in missing)}")
+
+    pipeline = Pipeline(config, template_path, output_file, progress_event_callback=progress_event_callback)
+    pipeline.report_rule_gaps(processing_plan)
+    # 与单进程运行相同：按模板中的地址顺序整理
+    for address in addresses:
+        if address in fetched:
+            pipeline.raw_data[address] = fetched[address]
+    processed_data = pipeline.process_and_write(template_df, processing_plan)
+    pipeline.metrics.export(config["config"].get("metrics"))
+    return processed_data
+
+
+def split_ak_limits(config, count):
+    """
+    多个进程共用同一组AK时，各进程的QPS与每日配额按分片数均分
+    :return: 新的配置（不修改原配置）
+    """
+    config = json.loads(json.dumps(config))
+    options = config["config"]
+    entries = options.get("ak_pool") or options["ak"]
+    if not isinstance(entries, list):
+        entries = [entries]
+    pool = []
+    for entry in entries:
+        entry = dict(entry) if isinstance(entry, dict) else {"ak": entry}
+        entry["qps"] = entry.get("qps", DEFAULT_QPS) / count
+        if entry.get("daily_quota"):
+            entry["daily_quota"] = entry["daily_quota"] // count
+        pool.append(entry)
+    options["ak_pool"] = pool
+    return config
+
+
+def run_sharded(config, template_path, output_file, count, workdir=None, processes=None):
+    """
+    本机多进程分片运行：每片一个进程（各自的客户端与连接池），全部完成后合并
+    :param workdir: 分片文件目录，默认与输出文件同目录
+    :return: 合并后的加工结果
+    """
+    workdir = workdir or os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(workdir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(output_file))[0]
+    shard_paths = [os.path.join(workdir, f"{stem}.shard{index}of{count}.jsonl") for index in range(count)]
+    shard_config = split_ak_limits(config, count)
+
+    with ProcessPoolExecutor(max_workers=processes or count) as pool:
+        futures = [
+            pool.submit(fetch_shard, shard_config, template_path, index, count, path)
+            for index, path in enumerate(shard_paths)
+        ]
+        for index, future in enumerate(futures):
+            print(f"分片{index + 1}/{count}完成：获取{future.result()}个地址")
+
+    processed_data = merge_shards(config, template_path, shard_paths, output_file)
+    for path in shard_paths:
+        os.remove(path)
+    return processed_data
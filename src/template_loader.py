@@ -0,0 +1,61 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xls", ".csv", ".parquet")
+REQUIRED_COLUMNS = ("分组", "小区", "类型")
+
+
+def load_template(path):
+    """
+    读取模板文件（整个流程只读取一次，结果在各环节间共享）
+    - .xlsx/.xls：安装了 python-calamine 时使用 calamine 引擎，否则使用 openpyxl 只读模式
+    - .csv：UTF-8（兼容带BOM）
+    - .parquet：需要安装 pyarrow
+    :return: DataFrame，"分组" 列统一为字符串
+    """
+    import pandas as pd
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        df = pd.read_csv(path, dtype={'分组': str}, encoding="utf-8-sig")
+    elif ext == ".parquet":
+        df = pd.read_parquet(path)
+        if '分组' in df.columns:
+            df['分组'] = df['分组'].map(lambda v: v if pd.isna(v) else str(v))
+    elif ext in (".xlsx", ".xls"):
+        df = pd.read_excel(path, dtype={'分组': str}, engine=_excel_engine(ext))
+    else:
+        raise ValueError(f"不支持的文件格式: {ext}，支持 {'、'.join(SUPPORTED_EXTENSIONS)}")
+
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"模板缺少列: {'、'.join(missing)}")
+    return df
+
+
+def _excel_engine(ext):
+    """优先使用 calamine（Rust实现，读取速度远快于openpyxl）"""
+    try:
+        import python_calamine  # noqa: F401
+        import pandas as pd
+        major, minor = (int(part) for part in pd.__version__.split(".")[:2])
+        if (major, minor) >= (2, 2):
+            return "calamine"
+    except (ImportError, ValueError):
+        pass
+    # openpyxl 引擎本身以只读模式读取；.xls 交给pandas自动选择
+    return "openpyxl" if ext == ".xlsx" else None
@@ -0,0 +1,97 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+测试共用：把 src 加入导入路径，生成测试用的配置与模板
+"""
+
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# 测试用的启用字段：(名称, 半径)
+TEST_FIELDS = [
+    ("位置", None),
+    ("距最近商服中心的距离(公里)", 2000),
+    ("商服网点聚集程度", 1000),
+    ("距公交站点距离（米）", 500),
+]
+
+KM_RULES = {
+    "优": {"min": None, "max": 0.5},
+    "较优": {"min": 0.5, "max": 1.0},
+    "一般": {"min": 1.0, "max": 2.0},
+    "较差": {"min": 2.0, "max": 3.0},
+    "差": {"min": 3.0, "max": None},
+}
+METER_RULES = {
+    "优": {"min": None, "max": 100},
+    "较优": {"min": 100, "max": 200},
+    "一般": {"min": 200, "max": 300},
+    "较差": {"min": 300, "max": 400},
+    "差": {"min": 400, "max": None},
+}
+
+
+def make_config(base_url=None, **options):
+    """
+    生成配置（默认关闭持久化缓存与断点日志）
+    :param base_url: 接口地址，通常为 mock_server.MockBaiduServer.url
+    :param options: 覆盖 config["config"] 中的项
+    """
+    items = [
+        {"original_index": index, "display_index": index, "name": name, "enabled": True, "radius": radius}
+        for index, (name, radius) in enumerate(TEST_FIELDS)
+    ]
+    comparisons = {"1": KM_RULES, "3": METER_RULES}
+    config = {
+        "ak": "test-ak",
+        "items": items,
+        "comparisons": comparisons,
+        "display_order": list(range(len(items))),
+        "cache": {"enabled": False},
+        "journal": {"enabled": False},
+        "max_workers": 4,
+    }
+    if base_url:
+        config["base_url"] = base_url
+    config.update(options)
+    return {"config": config}
+
+
+def write_template(path, group_count=4, per_group=3):
+    """
+    写出CSV模板：每个分组包含本组的小区与相邻分组的一个小区（用于检查共享地址）
+    :return: 模板中的地址列表（按首次出现顺序）
+    """
+    import csv
+
+    rows, addresses = [], []
+    for group in range(group_count):
+        members = [f"测试小区{group}-{index}" for index in range(per_group)]
+        members.append(f"测试小区{(group + 1) % group_count}-0")
+        for index, community in enumerate(members):
+            rows.append({"分组": str(group + 1), "小区": community, "类型": "估价对象" if index == 0 else f"可比实例{index}"})
+            if community not in addresses:
+                addresses.append(community)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["分组", "小区", "类型"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return addresses
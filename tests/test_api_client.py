@@ -0,0 +1,174 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import math
+import time
+import unittest
+
+import support  # noqa: F401
+import mock_server
+from api_client import PAGE_SIZE, BaiduMapClient
+from cache_store import MemoryCache
+
+QUERY = "超市"
+SEARCH_PATH = "/place/v2/search"
+# 模拟接口不分页时每页返回的条数
+MOCK_PAGE_SIZE = 10
+
+
+def find_coord(radius, predicate):
+    """找一个在模拟接口中 radius 半径内POI总数满足 predicate 的坐标"""
+    for step in range(1000):
+        coord = (116.3 + step * 0.001, 39.9)
+        total = mock_server.place_search(QUERY, f"{coord[1]},{coord[0]}", radius, MOCK_PAGE_SIZE, 0)["total"]
+        if predicate(total):
+            return coord
+    raise AssertionError("模拟接口中没有满足条件的坐标")
+
+
+class ClientTestCase(unittest.TestCase):
+    client_options = {}
+
+    def setUp(self):
+        self.server = mock_server.MockBaiduServer().start()
+        self.addCleanup(self.server.stop)
+        self.client = self.make_client()
+
+    def make_client(self, **options):
+        client = BaiduMapClient("test-ak", base_url=self.server.url, **dict(self.client_options, **options))
+        self.addCleanup(client.close)
+        return client
+
+    def search_calls(self):
+        return self.server.calls.get(SEARCH_PATH, 0)
+
+
+class RadiusDerivationTest(ClientTestCase):
+    def test_exact_radius_is_cached(self):
+        coord = find_coord(1000, lambda total: total <= MOCK_PAGE_SIZE)
+        first = self.client._search_poi(QUERY, coord, 1000)
+        self.assertEqual(self.client._search_poi(QUERY, coord, 1000), first)
+        self.assertEqual(self.search_calls(), 1)
+
+    def test_smaller_radius_derived_from_complete_result(self):
+        coord = find_coord(1000, lambda total: 0 < total <= MOCK_PAGE_SIZE)
+        large = self.client._search_poi(QUERY, coord, 1000)
+        small = self.client._search_poi(QUERY, coord, 500)
+        self.assertEqual(self.search_calls(), 1)
+        self.assertEqual(small, [poi for poi in large if poi["detail_info"]["distance"] <= 500])
+        self.assertEqual(small, sorted(small, key=lambda poi: poi["detail_info"]["distance"]))
+
+    def test_larger_radius_is_not_derived(self):
+        coord = find_coord(500, lambda total: total <= MOCK_PAGE_SIZE)
+        self.client._search_poi(QUERY, coord, 500)
+        self.client._search_poi(QUERY, coord, 1000)
+        self.assertEqual(self.search_calls(), 2)
+
+    def test_truncated_result_is_not_used(self):
+        coord = find_coord(1000, lambda total: total > MOCK_PAGE_SIZE)
+        self.client._search_poi(QUERY, coord, 1000)
+        small = self.client._search_poi(QUERY, coord, 500)
+        self.assertEqual(self.search_calls(), 2)
+        expected = mock_server.place_search(QUERY, f"{coord[1]},{coord[0]}", 500, MOCK_PAGE_SIZE, 0)["results"]
+        self.assertEqual([poi["uid"] for poi in small], [poi["uid"] for poi in expected])
+
+    def test_radii_share_one_cache_entry(self):
+        coord = find_coord(500, lambda total: total > MOCK_PAGE_SIZE)
+        self.client._search_poi(QUERY, coord, 500)
+        self.client._search_poi(QUERY, coord, 1000)
+        entry = self.client.cache.get("poi", f"{QUERY}|{self.client._coord_key(coord)}")
+        self.assertEqual(set(entry), {"500", "1000"})
+        self.assertTrue(all("fetched_at" in page for page in entry.values()))
+
+    def test_expired_radius_is_skipped(self):
+        cache = MemoryCache()
+        cache.ttl = {"poi": 60}
+        client = self.make_client(cache=cache)
+        coord = find_coord(1000, lambda total: total <= MOCK_PAGE_SIZE)
+        client._search_poi(QUERY, coord, 1000)
+
+        cache_key = f"{QUERY}|{client._coord_key(coord)}"
+        entry = cache.get("poi", cache_key)
+        entry["1000"]["fetched_at"] = time.time() - 120
+        client._search_poi(QUERY, coord, 500)
+        self.assertEqual(self.search_calls(), 2)
+        # 重新写入时丢弃已过期的半径
+        self.assertEqual(set(cache.get("poi", cache_key)), {"500"})
+
+
+class PaginationTest(ClientTestCase):
+    client_options = {"paginate": True}
+
+    def test_fetches_all_pages(self):
+        coord = find_coord(1000, lambda total: total > 2 * PAGE_SIZE)
+        page = self.client._fetch_poi(QUERY, coord, 1000)
+        pages = math.ceil(page["total"] / PAGE_SIZE)
+        self.assertEqual(len(page["results"]), page["total"])
+        self.assertEqual(page["pages"], pages)
+        self.assertEqual(self.search_calls(), pages)
+        self.assertEqual(len({poi["uid"] for poi in page["results"]}), page["total"])
+        distances = [poi["detail_info"]["distance"] for poi in page["results"]]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_single_page_needs_one_request(self):
+        coord = find_coord(1000, lambda total: 0 < total <= PAGE_SIZE)
+        page = self.client._fetch_poi(QUERY, coord, 1000)
+        self.assertEqual(page["pages"], 1)
+        self.assertEqual(self.search_calls(), 1)
+
+    def test_max_pages_truncates(self):
+        client = self.make_client(max_pages=2)
+        coord = find_coord(1000, lambda total: total > 2 * PAGE_SIZE)
+        page = client._fetch_poi(QUERY, coord, 1000)
+        self.assertEqual(len(page["results"]), 2 * PAGE_SIZE)
+        self.assertEqual(self.search_calls(), 2)
+        # 截断的结果不能推导小半径
+        client._search_poi(QUERY, coord, 1000)
+        self.assertEqual(self.search_calls(), 4)
+        client._search_poi(QUERY, coord, 500)
+        self.assertGreater(self.search_calls(), 4)
+
+    def test_refetches_when_cached_pages_are_fewer_than_configured(self):
+        cache = MemoryCache()
+        coord = find_coord(1000, lambda total: total > 2 * PAGE_SIZE)
+        self.make_client(cache=cache, max_pages=1)._search_poi(QUERY, coord, 1000)
+        self.assertEqual(self.search_calls(), 1)
+
+        results = self.make_client(cache=cache)._search_poi(QUERY, coord, 1000)
+        total = mock_server.place_search(QUERY, f"{coord[1]},{coord[0]}", 1000, PAGE_SIZE, 0)["total"]
+        self.assertEqual(len(results), total)
+        self.assertEqual(self.search_calls(), 1 + math.ceil(total / PAGE_SIZE))
+
+    def test_failed_page_fails_whole_search(self):
+        coord = find_coord(1000, lambda total: total > 2 * PAGE_SIZE)
+        fetch_page = self.client._fetch_poi_page
+
+        def failing_page(params, control=None):
+            return None if params["page_num"] == 2 else fetch_page(params, control)
+
+        self.client._fetch_poi_page = failing_page
+        self.assertIsNone(self.client._search_poi(QUERY, coord, 1000))
+        cache_key = f"{QUERY}|{self.client._coord_key(coord)}"
+        self.assertIsNone(self.client.cache.get("poi", cache_key))
+
+        # 恢复后重新检索并缓存完整结果
+        self.client._fetch_poi_page = fetch_page
+        results = self.client._search_poi(QUERY, coord, 1000)
+        self.assertEqual(len(results), self.client.cache.get("poi", cache_key)["1000"]["total"])
+
+
+if __name__ == "__main__":
+    unittest.main()
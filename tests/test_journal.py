@@ -0,0 +1,157 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import support
+import mock_server
+from journal import FetchJournal, job_fingerprint
+from pipeline import Pipeline
+
+GEOCODE_PATH = "/geocoding/v3"
+ADDRESSES = [f"测试小区{index}" for index in range(6)]
+
+
+class JobFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.config = support.make_config()
+        self.fingerprint = job_fingerprint(ADDRESSES, self.config)
+
+    def changed(self, **options):
+        config = json.loads(json.dumps(self.config))
+        config["config"].update(options)
+        return job_fingerprint(ADDRESSES, config)
+
+    def test_stable(self):
+        self.assertEqual(job_fingerprint(list(ADDRESSES), support.make_config()), self.fingerprint)
+
+    def test_addresses(self):
+        self.assertNotEqual(job_fingerprint(ADDRESSES[:-1], self.config), self.fingerprint)
+        self.assertNotEqual(job_fingerprint(ADDRESSES[::-1], self.config), self.fingerprint)
+
+    def test_fetch_options_change_fingerprint(self):
+        items = json.loads(json.dumps(self.config["config"]["items"]))
+        items[1]["radius"] = 3000
+        self.assertNotEqual(self.changed(items=items), self.fingerprint)
+        items = json.loads(json.dumps(self.config["config"]["items"]))
+        items[2]["enabled"] = False
+        self.assertNotEqual(self.changed(items=items), self.fingerprint)
+
+        for options in (
+            {"pagination": {"enabled": True, "max_pages": 3}},
+            {"grid_snap": {"enabled": True, "cell_size": 100}},
+            {"address_normalization": {"enabled": True, "city_prefix": "北京市"}},
+            {"poi_index": {"path": "poi_index/"}},
+            {"base_url": "http://127.0.0.1:8765"},
+        ):
+            with self.subTest(options=options):
+                self.assertNotEqual(self.changed(**options), self.fingerprint)
+
+    def test_processing_options_do_not_change_fingerprint(self):
+        for options in (
+            {"ak": "other-ak"},
+            {"comparisons": {}},
+            {"display_order": list(reversed(self.config["config"]["display_order"]))},
+            {"streaming": True},
+            {"base_url": "https://api.map.baidu.com/"},
+        ):
+            with self.subTest(options=options):
+                self.assertEqual(self.changed(**options), self.fingerprint)
+
+
+class FetchJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.config = support.make_config()
+
+    def test_round_trip(self):
+        journal = FetchJournal.for_job(ADDRESSES, self.config, self.dir)
+        journal.append("甲", {"coordinates": [116.3, 39.9]})
+        journal.append("乙", {"coordinates": [116.4, 39.8]})
+        journal.close()
+        reopened = FetchJournal.for_job(ADDRESSES, self.config, self.dir)
+        self.assertEqual(reopened.load(), {"甲": {"coordinates": [116.3, 39.9]}, "乙": {"coordinates": [116.4, 39.8]}})
+
+    def test_broken_tail_is_ignored(self):
+        journal = FetchJournal(os.path.join(self.dir, "job.jsonl"))
+        journal.append("甲", {"n": 1})
+        journal.close()
+        with open(journal.path, "a", encoding="utf-8") as f:
+            f.write('{"address": "乙", "ra')
+        self.assertEqual(journal.load(), {"甲": {"n": 1}})
+
+        journal.append("丙", {"n": 3})
+        journal.close()
+        self.assertEqual(journal.load(), {"甲": {"n": 1}, "丙": {"n": 3}})
+
+    def test_discard(self):
+        journal = FetchJournal(os.path.join(self.dir, "job.jsonl"))
+        journal.append("甲", {"n": 1})
+        journal.discard()
+        self.assertFalse(os.path.exists(journal.path))
+
+
+class ResumeTest(unittest.TestCase):
+    """以相同配置重新运行时只获取断点日志中没有的地址，影响原始数据的配置改动后从头获取"""
+
+    def setUp(self):
+        self.server = mock_server.MockBaiduServer().start()
+        self.addCleanup(self.server.stop)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def make_config(self, **options):
+        return support.make_config(self.server.url, journal={"enabled": True, "dir": self.dir}, **options)
+
+    def fetch(self, config):
+        before = self.server.calls.get(GEOCODE_PATH, 0)
+        pipeline = Pipeline(config, None, None)
+        raw_data = pipeline.fetch(ADDRESSES)
+        return raw_data, self.server.calls.get(GEOCODE_PATH, 0) - before
+
+    def write_journal(self, config, count):
+        """模拟中断：前 count 个地址已写入断点日志"""
+        raw_data, _ = self.fetch(support.make_config(self.server.url))
+        journal = FetchJournal.for_job(ADDRESSES, config, self.dir)
+        for address in ADDRESSES[:count]:
+            journal.append(address, raw_data[address])
+        journal.close()
+        return journal, raw_data
+
+    def test_resume_fetches_remaining_addresses(self):
+        config = self.make_config()
+        journal, expected = self.write_journal(config, 4)
+        raw_data, geocoded = self.fetch(config)
+        self.assertEqual(geocoded, len(ADDRESSES) - 4)
+        self.assertEqual(list(raw_data), ADDRESSES)
+        self.assertEqual(json.loads(json.dumps(raw_data)), json.loads(json.dumps(expected)))
+        # 成功完成后删除断点日志
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_changed_fetch_option_starts_over(self):
+        journal, _ = self.write_journal(self.make_config(), 4)
+        _, geocoded = self.fetch(self.make_config(grid_snap={"enabled": True, "cell_size": 100}))
+        self.assertEqual(geocoded, len(ADDRESSES))
+        self.assertTrue(os.path.exists(journal.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
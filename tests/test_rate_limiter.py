@@ -0,0 +1,153 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+import unittest
+
+import support  # noqa: F401
+from job_control import JobCancelled, JobControl
+from rate_limiter import AKPool, KeySlot, QuotaExhaustedError, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(rate=10)
+        now = bucket.updated_at
+        for _ in range(10):
+            self.assertEqual(bucket.wait_time(now), 0.0)
+            bucket.consume()
+        self.assertAlmostEqual(bucket.wait_time(now), 0.1)
+
+    def test_refill_is_capped(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        now = bucket.updated_at
+        bucket.consume()
+        bucket.consume()
+        self.assertAlmostEqual(bucket.wait_time(now + 0.05), 0.05)
+        bucket.wait_time(now + 100)
+        self.assertEqual(bucket.tokens, 2)
+
+    def test_zero_rate_is_unlimited(self):
+        bucket = TokenBucket(rate=0)
+        for _ in range(100):
+            bucket.consume()
+        self.assertEqual(bucket.wait_time(time.monotonic()), 0.0)
+
+
+class KeySlotTest(unittest.TestCase):
+    def test_daily_quota(self):
+        slot = KeySlot("ak", daily_quota=2)
+        now = time.monotonic()
+        self.assertTrue(slot.available(now))
+        slot.used_today = 2
+        self.assertFalse(slot.available(now))
+
+    def test_parked_until(self):
+        slot = KeySlot("ak")
+        now = time.monotonic()
+        slot.parked_until = now + 1
+        self.assertFalse(slot.available(now))
+        self.assertTrue(slot.available(now + 1))
+
+    def test_roll_day_resets_usage_and_parking(self):
+        slot = KeySlot("ak", daily_quota=1)
+        slot.used_today = 1
+        slot.parked_until = time.monotonic() + 3600
+        slot.day = slot.day.replace(year=slot.day.year - 1)
+        slot.roll_day()
+        self.assertEqual(slot.used_today, 0)
+        self.assertTrue(slot.available(time.monotonic()))
+
+    def test_roll_day_keeps_disabled(self):
+        slot = KeySlot("ak")
+        slot.disabled = True
+        slot.day = slot.day.replace(year=slot.day.year - 1)
+        slot.roll_day()
+        self.assertFalse(slot.available(time.monotonic()))
+
+
+class AKPoolTest(unittest.TestCase):
+    def test_from_config(self):
+        pool = AKPool.from_config(["a", {"ak": "b", "qps": 5, "daily_quota": 100}, ""])
+        self.assertEqual([slot.ak for slot in pool.slots], ["a", "b"])
+        self.assertEqual(pool.slots[1].bucket.rate, 5)
+        self.assertEqual(pool.slots[1].daily_quota, 100)
+        with self.assertRaises(ValueError):
+            AKPool.from_config([])
+
+    def test_round_robin(self):
+        pool = AKPool.from_config(["a", "b", "c"])
+        self.assertEqual([pool.acquire().ak for _ in range(6)], ["a", "b", "c", "a", "b", "c"])
+
+    def test_skips_exhausted_key(self):
+        pool = AKPool.from_config([{"ak": "a", "daily_quota": 1}, "b"])
+        self.assertEqual([pool.acquire().ak for _ in range(4)], ["a", "b", "b", "b"])
+        self.assertEqual(pool.slots[0].used_today, 1)
+
+    def test_report_concurrency_parks_briefly(self):
+        pool = AKPool.from_config(["a", "b"])
+        slot = pool.slots[0]
+        self.assertTrue(pool.report(slot, 401))
+        self.assertGreater(slot.parked_until, time.monotonic())
+        self.assertEqual(pool.acquire().ak, "b")
+
+        other = pool.slots[1]
+        self.assertTrue(pool.report(other, 402, park_on_concurrency=False))
+        self.assertEqual(other.parked_until, 0.0)
+
+    def test_report_daily_quota_parks_until_tomorrow(self):
+        pool = AKPool.from_config(["a"])
+        slot = pool.slots[0]
+        self.assertTrue(pool.report(slot, 302))
+        self.assertFalse(slot.disabled)
+        self.assertGreater(slot.parked_until - time.monotonic(), 0)
+        self.assertFalse(slot.available(time.monotonic()))
+
+    def test_report_invalid_key_disables(self):
+        pool = AKPool.from_config(["a", "b"])
+        self.assertTrue(pool.report(pool.slots[0], 101))
+        self.assertTrue(pool.slots[0].disabled)
+        self.assertFalse(pool.report(pool.slots[1], 0))
+        self.assertEqual({pool.acquire().ak for _ in range(3)}, {"b"})
+
+    def test_all_keys_unavailable(self):
+        pool = AKPool.from_config(["a", "b"])
+        pool.report(pool.slots[0], 101)
+        pool.report(pool.slots[1], 302)
+        with self.assertRaises(QuotaExhaustedError):
+            pool.acquire()
+
+    def test_waits_for_parked_key(self):
+        pool = AKPool.from_config(["a"])
+        pool.slots[0].parked_until = time.monotonic() + 0.2
+        started = time.monotonic()
+        self.assertEqual(pool.acquire().ak, "a")
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_cancel_interrupts_wait(self):
+        pool = AKPool.from_config(["a"])
+        pool.slots[0].parked_until = time.monotonic() + 30
+        control = JobControl()
+        threading.Timer(0.1, control.cancel).start()
+        started = time.monotonic()
+        with self.assertRaises(JobCancelled):
+            pool.acquire(control)
+        self.assertLess(time.monotonic() - started, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import contextlib
+import io
+import unittest
+
+import support
+from data_processor import DataProcessor
+from rule_engine import LEVEL_SCORES, RuleError, RuleSet
+
+
+class RuleSetTest(unittest.TestCase):
+    def test_intervals_are_left_closed(self):
+        rules = RuleSet(support.KM_RULES)
+        self.assertEqual(rules.level(0), "优")
+        self.assertEqual(rules.level(0.5), "较优")
+        self.assertEqual(rules.level(0.4999), "优")
+        self.assertEqual(rules.level(2.0), "较差")
+        self.assertEqual(rules.level(100), "差")
+        self.assertEqual(rules.level(-1), "优")
+        self.assertEqual(rules.level(None), "")
+        self.assertEqual(rules.gaps, [])
+
+    def test_overlap_is_rejected(self):
+        with self.assertRaises(RuleError) as raised:
+            RuleSet({"优": {"min": 0, "max": 1.5}, "一般": {"min": 1, "max": 2}}, field_name="距离")
+        self.assertIn("距离", str(raised.exception))
+
+    def test_empty_range_is_rejected(self):
+        with self.assertRaises(RuleError):
+            RuleSet({"优": {"min": 2, "max": 1}})
+        with self.assertRaises(RuleError):
+            RuleSet({"优": {"min": 1, "max": 1}})
+
+    def test_gaps_are_recorded(self):
+        rules = RuleSet({"优": {"min": 0, "max": 1}, "一般": {"min": 2, "max": 3}, "差": {"min": 5, "max": None}})
+        self.assertEqual(rules.gaps, [(1.0, 2.0), (3.0, 5.0)])
+        self.assertEqual(rules.level(1.5), "")
+        self.assertEqual(rules.level(-0.1), "")
+        self.assertEqual(rules.level(2), "一般")
+
+    def test_unset_levels_are_ignored(self):
+        rules = RuleSet({"优": {"min": None, "max": None}, "差": {"min": 1, "max": None}})
+        self.assertEqual([interval.level for interval in rules.intervals], ["差"])
+        self.assertFalse(RuleSet({}))
+
+    def test_evaluate_column_matches_level(self):
+        rules = RuleSet({"优": {"min": 0, "max": 1}, "一般": {"min": 2, "max": 3}})
+        values = [0, 0.5, 1, 1.5, 2, 3, None, -1]
+        levels, scores = rules.evaluate_column(values)
+        self.assertEqual(levels, [rules.level(value) for value in values])
+        self.assertEqual(scores, [LEVEL_SCORES.get(level) for level in levels])
+
+    def test_evaluate_column_without_rules(self):
+        self.assertEqual(RuleSet({}).evaluate_column([1, 2]), (["", ""], [None, None]))
+
+
+class CompileTest(unittest.TestCase):
+    def test_rule_gaps_are_returned_not_printed(self):
+        config = support.make_config()
+        config["config"]["comparisons"]["1"] = {"优": {"min": 0, "max": 1}, "差": {"min": 2, "max": None}}
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            plan = DataProcessor.compile(config)
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(plan.rule_gaps, [(support.TEST_FIELDS[1][0], [(1.0, 2.0)])])
+
+    def test_overlap_fails_compile(self):
+        config = support.make_config()
+        config["config"]["comparisons"]["3"] = {"优": {"min": 0, "max": 200}, "差": {"min": 100, "max": None}}
+        with self.assertRaises(RuleError):
+            DataProcessor.compile(config)
+
+    def test_scored_columns(self):
+        plan = DataProcessor.compile(support.make_config())
+        self.assertEqual(plan.rule_gaps, [])
+        self.assertIn(support.TEST_FIELDS[1][0] + "评分", plan.columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/BaiduMap-SearchTool
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import support
+import mock_server
+from pipeline import Pipeline
+from sharding import fetch_shard, merge_shards, shard_addresses, shard_of, split_ak_limits
+
+SHARD_COUNT = 3
+
+
+def read_workbook(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path)
+    return {
+        name: [[cell.value for cell in row] for row in workbook[name].iter_rows()]
+        for name in workbook.sheetnames
+    }
+
+
+class ShardAssignmentTest(unittest.TestCase):
+    def test_partition(self):
+        addresses = [f"测试小区{index}" for index in range(50)]
+        shards = [shard_addresses(addresses, index, SHARD_COUNT) for index in range(SHARD_COUNT)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(addresses))
+        for index, shard in enumerate(shards):
+            self.assertTrue(all(shard_of(address, SHARD_COUNT) == index for address in shard))
+            # 分片内保持原顺序
+            self.assertEqual(shard, [address for address in addresses if address in shard])
+
+    def test_assignment_is_fixed(self):
+        # md5 取模，与进程及 PYTHONHASHSEED 无关
+        self.assertEqual(shard_of("测试小区0", 1000), int("e1e6ef52", 16) % 1000)
+
+    def test_invalid_index(self):
+        with self.assertRaises(ValueError):
+            shard_addresses(["甲"], SHARD_COUNT, SHARD_COUNT)
+
+    def test_split_ak_limits(self):
+        config = support.make_config(ak_pool=[{"ak": "a", "qps": 30, "daily_quota": 3000}, "b"])
+        original = json.loads(json.dumps(config))
+        pool = split_ak_limits(config, SHARD_COUNT)["config"]["ak_pool"]
+        self.assertEqual(pool[0], {"ak": "a", "qps": 10, "daily_quota": 1000})
+        self.assertEqual(pool[1]["ak"], "b")
+        self.assertEqual(config, original)
+
+
+class MergeTest(unittest.TestCase):
+    """各分片获取后合并的结果与单进程运行完全相同"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = mock_server.MockBaiduServer().start()
+        cls.dir = tempfile.mkdtemp()
+        cls.template = os.path.join(cls.dir, "模板.csv")
+        cls.addresses = support.write_template(cls.template, group_count=5)
+        cls.config = support.make_config(cls.server.url)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        shutil.rmtree(cls.dir)
+
+    def fetch_shards(self, config=None):
+        paths = [os.path.join(self.dir, f"结果.shard{index}of{SHARD_COUNT}.jsonl") for index in range(SHARD_COUNT)]
+        for index, path in enumerate(paths):
+            fetch_shard(config or self.config, self.template, index, SHARD_COUNT, path)
+        return paths
+
+    def test_merge_matches_single_run(self):
+        single_output = os.path.join(self.dir, "单进程.xlsx")
+        single = Pipeline(self.config, self.template, single_output).run()
+
+        merged_output = os.path.join(self.dir, "合并.xlsx")
+        merged = merge_shards(self.config, self.template, self.fetch_shards(), merged_output)
+
+        self.assertEqual(list(merged), self.addresses)
+        self.assertEqual(json.loads(json.dumps(merged)), json.loads(json.dumps(single)))
+        self.assertEqual(read_workbook(merged_output), read_workbook(single_output))
+
+    def test_missing_shard(self):
+        paths = self.fetch_shards()
+        with self.assertRaises(ValueError):
+            merge_shards(self.config, self.template, paths[:-1], os.path.join(self.dir, "缺片.xlsx"))
+
+    def test_shard_from_other_config(self):
+        other = support.make_config(self.server.url, pagination={"enabled": True})
+        paths = self.fetch_shards(other)
+        with self.assertRaises(ValueError):
+            merge_shards(self.config, self.template, paths, os.path.join(self.dir, "不一致.xlsx"))
+
+
+if __name__ == "__main__":
+    unittest.main()